@@ -7,3 +7,7 @@ class RequestError(Exception):
 # Create a global configuration
 from agh.config import Configuration
 config = Configuration()
+
+# Track what each node was last synced to
+from agh.journal import Journal
+journal = Journal(config.file.with_name("journal.json"))
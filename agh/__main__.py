@@ -2,12 +2,16 @@
 
 # Modules
 import sys
+import json
 from getpass import getpass
 from base64 import b64encode
 
-from agh import __version__, config
+from agh import __version__, config, formats, RequestError
 from agh.node import NodeList
-from agh.sync import sync
+from agh.drift import compare, drift, fetch, show_differences
+from agh.watch import watch
+from agh.verify import verify
+from agh.sync import push, show_plan, sync
 
 # Handle UI
 def list_records(records: dict[str, str]) -> None:
@@ -23,7 +27,7 @@ def main() -> None:
     match sys.argv[1:]:
         case [] | ["help"]:
             print("\033[34mCommands")
-            for command in ["help", "version", "node", "node add \033[33m<name>", "node del \033[33m<name>", "add \033[33m<domain> <address>", "del \033[33m<domain>", "list", "sync", "fetch"]:
+            for command in ["help", "version", "node", "node add \033[33m<name>", "node del \033[33m<name>", "node resolver \033[33m<name> [host:port]", "add \033[33m<domain> <address>", "del \033[33m<domain>", "list \033[33m[pattern] [--answer <address>]", "backend \033[33m<json|sqlite>", "sync", "sync --plan", "fetch", "drift", "watch", "verify", "import \033[33m<file> [hosts|csv|json]", "export \033[33m[hosts|csv|json]", "option", "option \033[33m<key> <value>"]:
                 print(f"    \033[90mdns {command}")
 
             print("\n\033[34mCopyright (c) 2025 \033[33miiPython\033[0m")
@@ -34,7 +38,7 @@ def main() -> None:
 
         case ["node"]:
             print("\033[34mCommands")
-            print("    \033[90mdns node add \033[33m<name>\n    \033[90mdns node del \033[33m<name>\n")
+            print("    \033[90mdns node add \033[33m<name>\n    \033[90mdns node del \033[33m<name>\n    \033[90mdns node resolver \033[33m<name> [host:port]\n")
 
             existing_nodes = node_list.all()
             if not existing_nodes:
@@ -66,6 +70,13 @@ def main() -> None:
             config.del_node(node_name)
             print("\033[32m✓ Node removed!\033[0m")
 
+        case ["node", "resolver", node_name, *resolver] if len(resolver) <= 1:
+            if not config.get_nodes().get(node_name):
+                return print("\033[90mNothing changed.\033[0m")
+
+            config.set_node_resolver(node_name, resolver[0] if resolver else None)
+            print(f"\033[32m✓ Node resolver {'updated' if resolver else 'reset'}!\033[0m")
+
         case ["list"]:
             records = config.get_records()
             if not records:
@@ -73,8 +84,34 @@ def main() -> None:
 
             list_records(records)
 
+        case ["list", *filters] if len(filters) in [1, 2, 3]:
+            match filters:
+                case [pattern]:
+                    records = config.find_records(pattern = pattern)
+
+                case ["--answer", answer]:
+                    records = config.find_records(answer = answer)
+
+                case [pattern, "--answer", answer] | ["--answer", answer, pattern]:
+                    records = config.find_records(pattern, answer)
+
+                case _:
+                    return print("unrecognized command")
+
+            if not records:
+                return print("\033[90mNo records matched.\033[0m")
+
+            list_records(records)
+
+        case ["backend", "json" | "sqlite" as backend]:
+            if config.get_option("backend", "json") == backend:
+                return print("\033[90mNothing changed.\033[0m")
+
+            config.set_backend(backend)
+            print(f"\033[32m✓ Records moved to the {backend} backend!\033[0m")
+
         case ["add", domain, address]:
-            records = config.get_records()
+            records = config.get_records().copy()
             config.add_record(domain, address)
 
             print(f"\033[32m✓ Record {'updated' if domain in records else 'added'}!\033[0m")
@@ -83,38 +120,111 @@ def main() -> None:
             if not nodes:
                 return print("\033[90mSkipping sync due to lack of managed nodes.")
 
-            sync(nodes, config.get_records())
+            push(nodes, records, config.get_records())
 
         case ["del", domain]:
-            records = config.get_records()
+            records = config.get_records().copy()
             if domain not in records:
                 return print("\033[90mNothing changed.\033[0m")
 
             config.del_record(domain)
-            sync(node_list.all(), records)
+
+            nodes = node_list.all()
+            if not nodes:
+                return print("\033[90mSkipping sync due to lack of managed nodes.")
+
+            push(nodes, records, config.get_records())
 
         case ["sync"]:
             sync(node_list.all(), config.get_records())
 
-        case ["fetch"]:
-            print("\033[90mAttempting to fetch records")
-
-            existing_nodes, existing_records = node_list.all(), {}
-            longest = node_list.longest_name()
+        case ["sync", "--plan"]:
+            show_plan(node_list.all(), config.get_records())
 
-            for node in existing_nodes:
-                fetched_records = node.get_records()
-                print(f"\033[90m    {node.name}{' ' * (longest - len(node.name))}...", end = "", flush = True)
-                existing_records |= {record["domain"]: record["answer"] for record in fetched_records}
+        case ["fetch"]:
+            results = {name: records for name, records in fetch(node_list.all()).items() if not isinstance(records, RequestError)}
+            if not results:
+                return print("\033[90mNo nodes could be reached, nothing changed.\033[0m")
 
-                print(f"\033[32m\tOK ({len(fetched_records)} record(s))")
+            # Later nodes take priority, but make any disagreement visible
+            existing_records = {}
+            for records in results.values():
+                existing_records |= records
 
             print()
+            if len(results) > 1:
+                show_differences(compare(results))
+                print()
+
             list_records(existing_records)
+            config.set_records(existing_records)
+
+        case ["drift"]:
+            drift(node_list.all(), config.get_records())
+
+        case ["verify"]:
+            nodes = node_list.all()
+            if not nodes:
+                return print("\033[90mNo nodes are being managed yet.\033[0m")
+
+            verify(nodes, config.get_records())
+
+        case ["watch"]:
+            try:
+                watch(node_list)
+
+            except KeyboardInterrupt:
+                print("\033[90mNo longer watching nodes.\033[0m")
+
+        case ["import", file, *format] if len(format) <= 1:
+            format = format[0] if format else formats.detect(file)
+            records = config.get_records().copy()
+
+            try:
+                if file == "-":
+                    config.add_records(formats.read(sys.stdin, format))
+
+                else:
+                    with open(file, newline = "") as handle:
+                        config.add_records(formats.read(handle, format))
+
+            except (OSError, ValueError, KeyError) as e:
+                return print(f"\033[31mFailed to import records: {e}\033[0m")
+
+            imported = sum(records.get(domain) != answer for domain, answer in config.get_records().items())
+            print(f"\033[32m✓ Imported {imported} record(s)!\033[0m")
+
+            nodes = node_list.all()
+            if not nodes:
+                return print("\033[90mSkipping sync due to lack of managed nodes.")
+
+            push(nodes, records, config.get_records())
+
+        case ["export", *format] if len(format) <= 1:
+            try:
+                formats.write(sys.stdout, config.get_records(), format[0] if format else "hosts")
+
+            except ValueError as e:
+                return print(f"\033[31m{e}\033[0m")
+
+        case ["option"]:
+            options = config.get_options()
+            if not options:
+                return print("\033[90mNo options have been set yet.\033[0m")
+
+            print("\033[34mOptions")
+            longest = len(max(options.keys(), key = lambda x: len(x)))
+            for key, value in options.items():
+                print(f"    \033[33m{key}{' ' * (longest - len(key))} \033[90m= {json.dumps(value)}")
+
+        case ["option", key, value]:
+            try:
+                config.set_option(key, json.loads(value))
+
+            except json.JSONDecodeError:
+                config.set_option(key, value)
 
-            # Manual, but it works
-            config.data["records"] = existing_records
-            config.save()
+            print("\033[32m✓ Option updated!\033[0m")
 
         case _:
             print("unrecognized command")
@@ -0,0 +1,145 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import os
+import sys
+import time
+import typing
+import tempfile
+import tracemalloc
+from pathlib import Path
+from contextlib import redirect_stdout
+
+from agh import config, formats, journal
+from agh.fake import FakeServer
+from agh.node import NodeList
+from agh.sync import push, sync
+from agh.drift import fetch
+from agh.journal import fingerprint
+
+# Scenarios, each one does its setup and returns the part that gets measured
+Scenario = typing.Callable[[list[FakeServer], NodeList, dict[str, str]], typing.Callable[[], typing.Any]]
+
+def scenario_sync(servers: list[FakeServer], node_list: NodeList, records: dict[str, str]) -> typing.Callable[[], typing.Any]:
+    config.set_records(records)
+    return lambda: sync(node_list.all(), records)
+
+def scenario_fetch(servers: list[FakeServer], node_list: NodeList, records: dict[str, str]) -> typing.Callable[[], typing.Any]:
+    for server in servers:
+        server.load(records)
+
+    return lambda: fetch(node_list.all())
+
+def scenario_add(servers: list[FakeServer], node_list: NodeList, records: dict[str, str]) -> typing.Callable[[], typing.Any]:
+    for server in servers:
+        server.load(records)
+
+    config.set_records(records)
+    for node in node_list.all():
+        journal.confirm(node.name, fingerprint(records))
+
+    def run() -> None:
+        previous = config.get_records().copy()
+        config.add_record("added.bench.lan", "10.255.255.255")
+        push(node_list.all(), previous, config.get_records())
+
+    return run
+
+def scenario_import(servers: list[FakeServer], node_list: NodeList, records: dict[str, str]) -> typing.Callable[[], typing.Any]:
+    file = config.file.with_name("import.hosts")
+    with file.open("w") as handle:
+        formats.write(handle, records, "hosts")
+
+    for node in node_list.all():
+        journal.confirm(node.name, fingerprint({}))
+
+    def run() -> None:
+        previous = config.get_records().copy()
+        with file.open() as handle:
+            config.add_records(formats.read(handle, "hosts"))
+
+        push(node_list.all(), previous, config.get_records())
+
+    return run
+
+SCENARIOS: dict[str, Scenario] = {
+    "sync": scenario_sync,
+    "fetch": scenario_fetch,
+    "add": scenario_add,
+    "import": scenario_import
+}
+
+# Handle benchmarking
+def generate(count: int) -> dict[str, str]:
+    return {f"host{index}.bench.lan": f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}" for index in range(count)}
+
+def measure(scenario: Scenario, servers: list[FakeServer], node_list: NodeList, records: dict[str, str], trace: bool = False) -> tuple[float, int, int]:
+    """Returns (wall time, requests served, peak traced memory) for one scenario run.
+    Tracing slows everything down considerably, so timings and memory come from separate runs."""
+
+    # Start every scenario from an empty store and empty nodes
+    for server in servers:
+        server.load({})
+
+    config.set_records({})
+    journal.data.clear()
+
+    run = scenario(servers, node_list, records)
+    requests = sum(server.requests for server in servers)
+
+    if trace:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        run()
+
+    elapsed, peak = time.perf_counter() - start, 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return elapsed, sum(server.requests for server in servers) - requests, peak
+
+def option(name: str, default: str) -> str:
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[:-1] else default
+
+def main() -> None:
+
+    # Keep benchmarks away from the real configuration, and clean up after ourselves
+    with tempfile.TemporaryDirectory(prefix = "agh-bench-") as directory:
+        config.file, journal.file = Path(directory) / "data.json", Path(directory) / "journal.json"
+        config.reload()
+        journal.data = {}
+        benchmark()
+
+def benchmark() -> None:
+    record_counts = [int(value) for value in option("--records", "10,1000,10000,100000").split(",")]
+    node_counts = [int(value) for value in option("--nodes", "1,4,16").split(",")]
+    scenarios = option("--scenarios", ",".join(SCENARIOS)).split(",")
+    latency = float(option("--latency", "0"))
+    memory = "--no-memory" not in sys.argv
+
+    print(f"\033[34magh benchmark \033[90m(latency: {latency * 1000:g}ms, concurrency: {config.get_option('concurrency', 8)})")
+    print(f"    \033[90m{'scenario':<8} {'records':>8} {'nodes':>5} {'wall':>10} {'requests':>9} {'peak':>10}")
+
+    for nodes in node_counts:
+        servers = [FakeServer(latency).start() for _ in range(nodes)]
+        config.data["nodes"] = {f"node{index}": {"url": server.url, "auth": ""} for index, server in enumerate(servers)}
+        config.save()
+
+        node_list = NodeList()
+        for count in record_counts:
+            records = generate(count)
+            for name in scenarios:
+                elapsed, requests, _ = measure(SCENARIOS[name], servers, node_list, records)
+                peak = f"{measure(SCENARIOS[name], servers, node_list, records, trace = True)[2] / 1048576:.1f}MiB" if memory else "-"
+                print(f"    \033[33m{name:<8} \033[90m{count:>8} {nodes:>5} {elapsed:>9.3f}s {requests:>9} {peak:>10}")
+
+        for server in servers:
+            server.stop()
+
+    print("\033[0m", end = "")
+
+if __name__ == "__main__":
+    main()
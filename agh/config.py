@@ -1,22 +1,57 @@
 # Copyright (c) 2025 iiPython
 
 # Modules
+import os
 import json
+import typing
+import tempfile
 from pathlib import Path
+from fnmatch import fnmatchcase
+
+from agh.store import SQLiteStore
+
+# Handle writing
+def write_atomic(file: Path, content: str) -> None:
+    """Write to a temporary file unique to this writer first, so an interrupted write never
+    leaves a half-written file behind and concurrent writers don't trample each other."""
+    handle = tempfile.NamedTemporaryFile("w", dir = file.parent, prefix = f".{file.name}.", suffix = ".tmp", delete = False)
+    try:
+        with handle:
+            handle.write(content)
+            handle.flush()
+            os.fsync(handle.fileno())
+            os.fchmod(handle.fileno(), file.stat().st_mode & 0o777 if file.is_file() else 0o644)  # mkstemp defaults to 0600
+
+        Path(handle.name).replace(file)
+
+    except BaseException:
+        Path(handle.name).unlink(missing_ok = True)
+        raise
 
 # Config handling
 class Configuration:
     def __init__(self, file: Path | None = None) -> None:
         self.file = file or (Path.home() / ".config/agh-control/data.json")
-        self.file.parent.mkdir(exist_ok = True)
+        self.file.parent.mkdir(parents = True, exist_ok = True)
+
+        self.reload()
+
+    def reload(self) -> None:
 
         # Load existing data
         self.data = {}
         if self.file.is_file():
             self.data = json.loads(self.file.read_text())
 
+        # Records can live in SQLite instead, keeping this file small
+        self.store = SQLiteStore(self.file.with_name("records.db")) if self.get_option("backend") == "sqlite" else None
+
+    def stamp(self) -> tuple[int, ...]:
+        """Modification times of everything backing this configuration, for cheap change detection."""
+        return tuple(file.stat().st_mtime_ns for file in (self.file, self.file.with_name("records.db")) if file.is_file())
+
     def save(self) -> None:
-        self.file.write_text(json.dumps(self.data, indent = 4))
+        write_atomic(self.file, json.dumps(self.data, indent = 4))
 
     def add_node(self, node: str, url: str, auth: str) -> None:
         if "nodes" not in self.data:
@@ -31,20 +66,93 @@ class Configuration:
             del self.data["nodes"][node]
             self.save()
 
+    def set_node_resolver(self, node: str, resolver: str | None) -> None:
+        if node in self.data.get("nodes", {}):
+            if resolver:
+                self.data["nodes"][node]["resolver"] = resolver
+
+            else:
+                self.data["nodes"][node].pop("resolver", None)
+
+            self.save()
+
     def get_nodes(self) -> dict[str, dict[str, str]]:
         return self.data.get("nodes", {})
 
     def add_record(self, domain: str, address: str) -> None:
+        if self.store is not None:
+            return self.store.add_record(domain, address)
+
         if "records" not in self.data:
             self.data["records"] = {}
 
         self.data["records"][domain] = address
         self.save()
 
+    def add_records(self, records: typing.Iterable[tuple[str, str]]) -> None:
+        if self.store is not None:
+            return self.store.add_records(records)
+
+        if "records" not in self.data:
+            self.data["records"] = {}
+
+        self.data["records"].update(records)
+        self.save()
+
     def del_record(self, domain: str) -> None:
+        if self.store is not None:
+            return self.store.del_record(domain)
+
         if domain in self.data.get("records", {}):
             del self.data["records"][domain]
             self.save()
 
+    def set_records(self, records: dict[str, str]) -> None:
+        if self.store is not None:
+            return self.store.set_records(records)
+
+        self.data["records"] = records
+        self.save()
+
     def get_records(self) -> dict[str, str]:
+        if self.store is not None:
+            return self.store.get_records()
+
         return self.data.get("records", {})
+
+    def find_records(self, pattern: str | None = None, answer: str | None = None) -> dict[str, str]:
+        if self.store is not None:
+            return self.store.find_records(pattern, answer)
+
+        return {
+            domain: address
+            for domain, address in self.get_records().items()
+            if (pattern is None or fnmatchcase(domain, pattern)) and (answer is None or address == answer)
+        }
+
+    def set_backend(self, backend: str) -> None:
+        """Move every record over to the given backend ("json" or "sqlite")."""
+        records = self.get_records().copy()
+        if backend == "sqlite":
+            self.store = SQLiteStore(self.file.with_name("records.db"))
+            self.store.set_records(records)
+            self.data.pop("records", None)
+
+        else:
+            self.store = None
+            self.data["records"] = records
+
+        self.set_option("backend", backend)
+
+    def get_option(self, key: str, default: typing.Any = None) -> typing.Any:
+        return self.data.get("options", {}).get(key, default)
+
+    def set_option(self, key: str, value: typing.Any) -> None:
+        if "options" not in self.data:
+            self.data["options"] = {}
+
+        self.data["options"][key] = value
+        self.save()
+
+    def get_options(self) -> dict[str, typing.Any]:
+        return self.data.get("options", {})
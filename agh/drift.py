@@ -0,0 +1,73 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+from agh import RequestError
+from agh.node import Node
+from agh.sync import parallel, write_metrics
+from agh.journal import fingerprint
+
+# Handle fetching
+def fetch(nodes: list[Node]) -> dict[str, dict[str, str] | RequestError]:
+    """Pull every node's rewrite list at once, printing a per-node digest as they come in."""
+    print("\033[90mAttempting to fetch records")
+
+    results, longest = {}, len(max(nodes, key = lambda node: len(node.name)).name)
+    for node, future in parallel(nodes, lambda node: {record["domain"]: record["answer"] for record in node.get_records()}):
+        print(f"\033[90m    {node.name}{' ' * (longest - len(node.name))}...", end = "", flush = True)
+
+        result, elapsed = future.result()
+        if isinstance(result, RequestError):
+            print(f"\033[31m\tFAIL \033[90m({result}, {elapsed:.2f}s)")
+
+        else:
+            print(f"\033[32m\tOK \033[90m({len(result)} record(s), digest {fingerprint(result)[:12]}, {elapsed:.2f}s)")
+
+        results[node.name] = result
+
+    write_metrics()
+    return results
+
+# Handle comparison
+def compare(sources: dict[str, dict[str, str]]) -> dict[str, dict[str, str | None]]:
+    """Return every domain that doesn't have the same answer across all sources."""
+    domains = set().union(*sources.values())
+    differences = {}
+    for domain in sorted(domains):
+        answers = {name: records.get(domain) for name, records in sources.items()}
+        if len(set(answers.values())) > 1:
+            differences[domain] = answers
+
+    return differences
+
+def show_differences(differences: dict[str, dict[str, str | None]]) -> None:
+    if not differences:
+        return print("\033[32m✓ Everything is consistent.\033[0m")
+
+    print(f"\033[34mDifferences \033[90m({len(differences)} domain(s))")
+
+    longest = len(max(differences.keys(), key = lambda x: len(x)))
+    for domain, answers in differences.items():
+        columns = "   ".join(
+            f"\033[90m{name} ⇀ " + (f"\033[33m{answer}" if answer is not None else "\033[31m(missing)")
+            for name, answer in answers.items()
+        )
+        print(f"    \033[33m{domain}{' ' * (longest - len(domain))}   {columns}")
+
+    print("\033[0m", end = "")
+
+def drift(nodes: list[Node], records: dict[str, str]) -> None:
+    results = fetch(nodes)
+    print(f"\n\033[34mDrift \033[90m(local digest {fingerprint(records)[:12]})")
+
+    sources, longest = {"local": records}, len(max(nodes, key = lambda node: len(node.name)).name)
+    for name, result in results.items():
+        if isinstance(result, RequestError):
+            print(f"    \033[33m{name}{' ' * (longest - len(name))} \033[31munreachable")
+            continue
+
+        sources[name] = result
+        changed = len(compare({"local": records, name: result}))
+        print(f"    \033[33m{name}{' ' * (longest - len(name))} " + (f"\033[31m{changed} domain(s) differ" if changed else "\033[32min sync"))
+
+    print()
+    show_differences(compare(sources))
@@ -0,0 +1,142 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import json
+import time
+import struct
+import typing
+import ipaddress
+from threading import Lock, Thread
+from socketserver import BaseRequestHandler, UDPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agh.verify import decode_name, encode_name, TYPE_A, TYPE_AAAA, TYPE_CNAME
+
+# Handle requests
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "FakeServer"
+
+    def log_message(self, format: str, *args: typing.Any) -> None:
+        pass
+
+    def respond(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_endpoint(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, response = self.server.handle(self.command, self.path.rsplit("/", 1)[-1], json.loads(body) if body else None)
+        self.respond(status, response)
+
+    do_GET = do_POST = do_PUT = handle_endpoint
+
+# Fake AdGuard Home
+class FakeServer(ThreadingHTTPServer):
+    """Minimal in-process stand-in for AdGuard Home's /control/rewrite API."""
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), FakeHandler)
+        self.latency, self.lock = latency, Lock()
+        self.records: dict[tuple[str, str], dict[str, str]] = {}
+        self.requests, self.transferred = 0, 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeServer":
+        Thread(target = self.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def load(self, records: dict[str, str]) -> None:
+        with self.lock:
+            self.records = {(domain, answer): {"domain": domain, "answer": answer} for domain, answer in records.items()}
+
+    def handle(self, method: str, endpoint: str, data: typing.Any) -> tuple[int, bytes]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests += 1
+            match method, endpoint:
+                case "GET", "list":
+                    response = json.dumps(list(self.records.values())).encode()
+                    self.transferred += len(response)
+                    return 200, response
+
+                case "POST", "add":
+                    self.records[(data["domain"], data["answer"])] = data
+
+                case "POST", "delete":
+                    if self.records.pop((data["domain"], data["answer"]), None) is None:
+                        return 400, b"rewrite not found"
+
+                case "PUT", "update":
+                    target = (data["target"]["domain"], data["target"]["answer"])
+                    if target not in self.records:
+                        return 400, b"rewrite not found"
+
+                    del self.records[target]
+                    self.records[(data["update"]["domain"], data["update"]["answer"])] = data["update"]
+
+                case _:
+                    return 404, b"not found"
+
+            return 200, b"OK"
+
+# Fake DNS
+class FakeResolverHandler(BaseRequestHandler):
+    server: "FakeResolver"
+
+    def handle(self) -> None:
+        packet, sock = self.request
+        identifier = struct.unpack_from("!H", packet)[0]
+        domain, offset = decode_name(packet, 12)
+        qtype = struct.unpack_from("!H", packet, offset)[0]
+
+        # Build answers the way AdGuard Home serves rewrites
+        answers, answer = [], self.server.records.get(domain)
+        if answer is not None:
+            try:
+                address = ipaddress.ip_address(answer)
+                if (qtype, address.version) in [(TYPE_A, 4), (TYPE_AAAA, 6)]:
+                    answers.append((qtype, address.packed))
+
+            except ValueError:
+                answers.append((TYPE_CNAME, encode_name(answer)))
+
+        response = struct.pack("!HHHHHH", identifier, 0x8180 if answer is not None else 0x8183, 1, len(answers), 0, 0) + packet[12:offset + 4]
+        for rtype, data in answers:
+            response += struct.pack("!HHHIH", 0xc00c, rtype, 1, 60, len(data)) + data
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        sock.sendto(response, self.client_address)
+
+class FakeResolver(UDPServer):
+    """Tiny DNS responder answering A/AAAA/CNAME queries from a dict of rewrites."""
+    def __init__(self, records: dict[str, str], latency: float = 0, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), FakeResolverHandler)
+        self.records, self.latency = records, latency
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeResolver":
+        Thread(target = self.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,61 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import csv
+import json
+import typing
+
+# Format detection
+FORMATS = ["hosts", "csv", "json"]
+
+def detect(filename: str) -> str:
+    suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return suffix if suffix in FORMATS else "hosts"
+
+# Handle reading
+def read(handle: typing.TextIO, format: str) -> typing.Iterator[tuple[str, str]]:
+    """Yield (domain, answer) pairs from an open file without loading it all up front."""
+    match format:
+        case "hosts":
+            for line in handle:
+                fields = line.split("#", 1)[0].split()
+                if len(fields) < 2:
+                    continue
+
+                yield from ((domain, fields[0]) for domain in fields[1:])
+
+        case "csv":
+            for row in csv.reader(handle):
+                if len(row) < 2 or [field.strip().lower() for field in row[:2]] == ["domain", "answer"]:
+                    continue
+
+                yield row[0].strip(), row[1].strip()
+
+        case "json":
+            data = json.load(handle)
+            if isinstance(data, dict):
+                yield from data.items()
+
+            else:
+                yield from ((record["domain"], record["answer"]) for record in data)
+
+        case _:
+            raise ValueError(f"unknown format '{format}'")
+
+# Handle writing
+def write(handle: typing.TextIO, records: dict[str, str], format: str) -> None:
+    match format:
+        case "hosts":
+            handle.writelines(f"{answer} {domain}\n" for domain, answer in records.items())
+
+        case "csv":
+            writer = csv.writer(handle)
+            writer.writerow(["domain", "answer"])
+            writer.writerows(records.items())
+
+        case "json":
+            json.dump(records, handle, indent = 4)
+            handle.write("\n")
+
+        case _:
+            raise ValueError(f"unknown format '{format}'")
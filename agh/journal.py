@@ -0,0 +1,58 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import json
+import typing
+import hashlib
+from pathlib import Path
+from threading import RLock
+
+from agh.config import write_atomic
+
+# Handle fingerprinting
+def fingerprint(records: dict[str, str]) -> str:
+    return hashlib.sha256("\n".join(f"{domain} {answer}" for domain, answer in sorted(records.items())).encode()).hexdigest()
+
+# Change journal
+class Journal:
+    """Tracks, per node, the fingerprint of the record set it was last confirmed to have
+    plus any operations queued on top of it that haven't been pushed yet."""
+    def __init__(self, file: Path) -> None:
+        self.file, self.lock = file, RLock()
+
+        # Load existing data
+        self.data = {}
+        if self.file.is_file():
+            self.data = json.loads(self.file.read_text())
+
+    def save(self) -> None:
+        with self.lock:
+            write_atomic(self.file, json.dumps(self.data))
+
+    def queue(self, node: str, operations: list[typing.Any], before: str, after: str) -> None:
+        entry = self.data.get(node)
+        if entry is not None and entry["pending"] is not None and not entry.get("inflight") and entry["target"] == before:
+            entry["pending"] += [list(operation) for operation in operations]
+
+        else:
+            entry = self.data[node] = {"fingerprint": None, "pending": None}
+
+        # Stays set until the push is confirmed, so a crash mid-push forces a full reconcile
+        entry["target"], entry["inflight"] = after, True
+
+    def pending(self, node: str) -> list[list[typing.Any]] | None:
+        """Returns the operations to push, or None if the node needs a full reconcile."""
+        entry = self.data.get(node)
+        return entry["pending"] if entry is not None else None
+
+    def advance(self, node: str) -> None:
+        with self.lock:
+            self.data[node]["pending"].pop(0)
+
+    def confirm(self, node: str, fingerprint: str) -> None:
+        with self.lock:
+            self.data[node] = {"fingerprint": fingerprint, "pending": [], "target": fingerprint}
+
+    def invalidate(self, node: str) -> None:
+        with self.lock:
+            self.data[node] = {"fingerprint": None, "pending": None, "target": None}
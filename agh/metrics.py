@@ -0,0 +1,91 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import json
+from pathlib import Path
+from threading import Lock
+
+from agh.config import write_atomic
+
+# Latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# Metric collection
+class Metrics:
+    """Per-node, per-endpoint request latency histograms, error counts and bytes transferred."""
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.series: dict[tuple[str, str], dict] = {}
+
+    def observe(self, node: str, endpoint: str, elapsed: float, sent: int, received: int, error: bool) -> None:
+        with self.lock:
+            series = self.series.get((node, endpoint))
+            if series is None:
+                series = self.series[(node, endpoint)] = {
+                    "buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0, "max": 0.0,
+                    "errors": 0, "sent": 0, "received": 0
+                }
+
+            for index, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    series["buckets"][index] += 1
+
+            series["count"] += 1
+            series["sum"] += elapsed
+            series["max"] = max(series["max"], elapsed)
+            series["errors"] += error
+            series["sent"] += sent
+            series["received"] += received
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP agh_request_duration_seconds Time taken by AdGuard Home API requests.",
+            "# TYPE agh_request_duration_seconds histogram"
+        ]
+        with self.lock:
+            series = sorted(self.series.items())
+
+        for (node, endpoint), data in series:
+            labels = f"node=\"{label(node)}\",endpoint=\"{label(endpoint)}\""
+            lines += [f"agh_request_duration_seconds_bucket{{{labels},le=\"{bound}\"}} {count}" for bound, count in zip(BUCKETS, data["buckets"])]
+            lines += [
+                f"agh_request_duration_seconds_bucket{{{labels},le=\"+Inf\"}} {data['count']}",
+                f"agh_request_duration_seconds_sum{{{labels}}} {data['sum']:.6f}",
+                f"agh_request_duration_seconds_count{{{labels}}} {data['count']}"
+            ]
+
+        for name, key, description in [
+            ("agh_request_errors_total", "errors", "Failed AdGuard Home API requests."),
+            ("agh_request_sent_bytes_total", "sent", "Request body bytes sent to AdGuard Home."),
+            ("agh_request_received_bytes_total", "received", "Response body bytes received from AdGuard Home.")
+        ]:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+            lines += [f"{name}{{node=\"{label(node)}\",endpoint=\"{label(endpoint)}\"}} {data[key]}" for (node, endpoint), data in series]
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, dict[str, dict]]:
+        summary = {}
+        with self.lock:
+            for (node, endpoint), data in sorted(self.series.items()):
+                summary.setdefault(node, {})[endpoint] = {
+                    "requests": data["count"],
+                    "errors": data["errors"],
+                    "mean_seconds": round(data["sum"] / data["count"], 6) if data["count"] else 0,
+                    "max_seconds": round(data["max"], 6),
+                    "sent_bytes": data["sent"],
+                    "received_bytes": data["received"],
+                    "buckets": dict(zip(map(str, BUCKETS), data["buckets"]))
+                }
+
+        return summary
+
+    def write(self, directory: Path) -> None:
+        directory.mkdir(parents = True, exist_ok = True)
+        write_atomic(directory / "agh.prom", self.prometheus())
+        write_atomic(directory / "metrics.json", json.dumps(self.summary(), indent = 4))
+
+metrics = Metrics()
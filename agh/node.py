@@ -2,29 +2,94 @@
 
 # Modules
 import json
-from urllib.error import HTTPError
-from urllib.request import Request, urlopen
+import time
+from http.client import CannotSendRequest, HTTPConnection, HTTPException, HTTPSConnection, RemoteDisconnected
+from urllib.parse import urlsplit
 
 from agh import config, RequestError
+from agh.policy import RequestPolicy
+from agh.metrics import metrics
 
 # Handle class
 class Node:
-    def __init__(self, name: str, url: str, auth: str) -> None:
-        self.name, self.url, self.auth = name, url, auth
-
-    def request(self, endpoint: str, **kwargs) -> str:
-        try:
-            return urlopen(Request(
-                f"{self.url}/control/rewrite/{endpoint}",
-                headers = {
-                    "Authorization": f"Basic {self.auth}",
-                    "Content-Type": "application/json"
-                },
-                **kwargs
-            )).read()
-
-        except HTTPError as e:
-            raise RequestError(e.code)
+    def __init__(self, name: str, url: str, auth: str, resolver: str | None = None) -> None:
+        self.name, self.url, self.auth, self.resolver = name, url, auth, resolver
+        self.connection: HTTPConnection | None = None
+        self.policy = RequestPolicy.from_config()
+
+    def connect(self, timeout: float) -> HTTPConnection:
+        if self.connection is None:
+            url = urlsplit(self.url)
+            self.connection = (HTTPSConnection if url.scheme == "https" else HTTPConnection)(url.hostname or "", url.port, timeout = timeout)
+
+        # Apply this request's timeout to an already open connection
+        self.connection.timeout = timeout
+        if self.connection.sock is not None:
+            self.connection.sock.settimeout(timeout)
+
+        return self.connection
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def send(self, method: str, path: str, data: bytes | None, timeout: float) -> tuple[int, bytes]:
+        headers = {
+            "Authorization": f"Basic {self.auth}",
+            "Content-Type": "application/json"
+        }
+
+        # Reuse the kept-alive connection, reconnecting once if the server dropped it while idle
+        while True:
+            reused = self.connection is not None
+            connection = self.connect(timeout)
+            try:
+                connection.request(method, path, body = data, headers = headers)
+                response = connection.getresponse()
+                body = response.read()
+                break
+
+            except (RemoteDisconnected, ConnectionResetError, BrokenPipeError, CannotSendRequest):
+                self.close()
+                if not reused:
+                    raise
+
+        if response.will_close:
+            self.close()
+
+        return response.status, body
+
+    def request(self, endpoint: str, method: str = "GET", data: bytes | None = None) -> bytes:
+        path = f"{urlsplit(self.url).path.rstrip('/')}/control/rewrite/{endpoint}"
+
+        # Only reads are safe to repeat, a retried add/update/delete might apply twice
+        attempt, idempotent = 0, method == "GET"
+        while True:
+            timeout, start = self.policy.remaining(), time.perf_counter()
+            try:
+                status, body = self.send(method, path, data, timeout)
+                metrics.observe(self.name, endpoint, time.perf_counter() - start, len(data or b""), len(body), status >= 400)
+                if status < 400:
+                    self.policy.success()
+                    return body
+
+                error = RequestError(f"HTTP {status}")
+                if status < 500:
+                    self.policy.success()
+                    raise error
+
+            except (OSError, HTTPException) as e:
+                metrics.observe(self.name, endpoint, time.perf_counter() - start, 0, 0, True)
+                self.close()
+                error = RequestError(str(e) or type(e).__name__)
+
+            self.policy.failure()
+            if not idempotent or attempt >= self.policy.retries:
+                raise error
+
+            time.sleep(self.policy.delay(attempt))
+            attempt += 1
 
     def get_records(self) -> list[dict[str, str]]:
         return json.loads(self.request("list"))
@@ -35,13 +100,29 @@ class Node:
     def add_record(self, record: dict[str, str]) -> None:
         self.request("add", method = "POST", data = json.dumps(record).encode())
 
+    def update_record(self, target: dict[str, str], update: dict[str, str]) -> None:
+        self.request("update", method = "PUT", data = json.dumps({"target": target, "update": update}).encode())
+
 class NodeList:
     def __init__(self) -> None:
-        pass
+        self.nodes: dict[str, Node] = {}
+
+    def node(self, name: str, url: str, auth: str, resolver: str | None = None) -> Node:
+        """Hand out the same Node (and therefore connection) for the rest of this run."""
+        node = self.nodes.get(name)
+        if node is None or (node.url, node.auth) != (url, auth):
+            if node is not None:
+                node.close()
+
+            node = self.nodes[name] = Node(name, url, auth)
+
+        node.resolver = resolver
+
+        return node
 
     def get(self, name: str) -> Node | None:
         nodes = config.get_nodes()
-        return Node(name, **nodes[name]) if name in nodes else None
+        return self.node(name, **nodes[name]) if name in nodes else None
 
     def add(self, name: str, url: str, auth: str) -> None:
         config.add_node(name, url, auth)
@@ -51,7 +132,7 @@ class NodeList:
 
     def all(self) -> list[Node]:
         return [
-            Node(name, **node)
+            self.node(name, **node)
             for name, node in config.get_nodes().items()
         ]
 
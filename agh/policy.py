@@ -0,0 +1,56 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import time
+import random
+
+from agh import config, RequestError
+
+# Request policy
+class RequestPolicy:
+    """Per-node timeouts, deadline, retry backoff and circuit breaker state."""
+    def __init__(self, timeout: float, retries: int, backoff: float, threshold: int, deadline: float) -> None:
+        self.timeout, self.retries, self.backoff, self.threshold, self.deadline = timeout, retries, backoff, threshold, deadline
+        self.expires: float | None = None
+        self.failures = 0
+
+    @classmethod
+    def from_config(cls) -> "RequestPolicy":
+        return cls(
+            float(config.get_option("request_timeout", 10)),
+            int(config.get_option("request_retries", 2)),
+            float(config.get_option("request_backoff", 0.5)),
+            int(config.get_option("breaker_threshold", 3)),
+            float(config.get_option("sync_deadline", 300))
+        )
+
+    def start(self) -> None:
+        """Begin a new sync, the deadline is counted from here."""
+        self.expires = time.monotonic() + self.deadline if self.deadline > 0 else None
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.start()
+
+    def remaining(self) -> float:
+        """Timeout to use for the next request, raising if this node shouldn't be contacted at all."""
+        if self.failures >= self.threshold:
+            raise RequestError("circuit open")
+
+        if self.expires is None:
+            return self.timeout
+
+        remaining = self.expires - time.monotonic()
+        if remaining <= 0:
+            raise RequestError("deadline exceeded")
+
+        return min(self.timeout, remaining)
+
+    def delay(self, attempt: int) -> float:
+        return min(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5), self.remaining())
+
+    def success(self) -> None:
+        self.failures = 0
+
+    def failure(self) -> None:
+        self.failures += 1
@@ -0,0 +1,65 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import typing
+import sqlite3
+from pathlib import Path
+
+# SQLite record storage
+class SQLiteStore:
+    """Record storage for large rewrite sets, indexed by domain, reversed domain and answer."""
+    def __init__(self, file: Path) -> None:
+        self.connection = sqlite3.connect(file)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                domain   TEXT PRIMARY KEY,
+                answer   TEXT NOT NULL,
+                reversed TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_answer ON records (answer);
+            CREATE INDEX IF NOT EXISTS records_reversed ON records (reversed);
+        """)
+
+    def add_records(self, records: typing.Iterable[tuple[str, str]]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO records VALUES (?, ?, ?) ON CONFLICT (domain) DO UPDATE SET answer = excluded.answer",
+                ((domain, answer, domain[::-1]) for domain, answer in records)
+            )
+
+    def add_record(self, domain: str, address: str) -> None:
+        self.add_records([(domain, address)])
+
+    def del_record(self, domain: str) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM records WHERE domain = ?", (domain,))
+
+    def set_records(self, records: dict[str, str]) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM records")
+            self.add_records(records.items())
+
+    def get_records(self) -> dict[str, str]:
+        return dict(self.connection.execute("SELECT domain, answer FROM records ORDER BY rowid"))
+
+    def find_records(self, pattern: str | None = None, answer: str | None = None) -> dict[str, str]:
+        query, arguments = [], []
+        if pattern is not None:
+
+            # "*.lan" style suffix patterns can use the reversed domain index
+            if pattern.startswith("*") and not any(character in pattern[1:] for character in "*?["):
+                query.append("reversed GLOB ?")
+                arguments.append(f"{pattern[1:][::-1]}*")
+
+            else:
+                query.append("domain GLOB ?")
+                arguments.append(pattern)
+
+        if answer is not None:
+            query.append("answer = ?")
+            arguments.append(answer)
+
+        return dict(self.connection.execute(
+            f"SELECT domain, answer FROM records {'WHERE ' + ' AND '.join(query) if query else ''} ORDER BY rowid",
+            arguments
+        ))
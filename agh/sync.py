@@ -1,47 +1,181 @@
 # Copyright (c) 2025 iiPython
 
 # Modules
-from agh import RequestError
+import time
+import typing
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from agh import config, journal, RequestError
+from agh.journal import fingerprint
+from agh.metrics import metrics
 from agh.node import Node
 
+T = typing.TypeVar("T")
+
+# Handle concurrency
+def parallel(nodes: list[Node], callback: typing.Callable[[Node], T]) -> typing.Iterator[tuple[Node, Future[tuple[T | RequestError, float]]]]:
+    """Run callback against every node at once, yielding futures back in node order.
+    Each future resolves to (result or RequestError, wall time in seconds)."""
+    def timed(node: Node) -> tuple[T | RequestError, float]:
+        start = time.perf_counter()
+        try:
+            return callback(node), time.perf_counter() - start
+
+        except RequestError as e:
+            return e, time.perf_counter() - start
+
+    for node in nodes:
+        node.policy.start()
+
+    with ThreadPoolExecutor(max_workers = max(1, int(config.get_option("concurrency", 8)))) as pool:
+        futures = [pool.submit(timed, node) for node in nodes]
+        yield from zip(nodes, futures)
+
+# Handle planning
+class Operation(typing.NamedTuple):
+    action: str
+    record: dict[str, str]
+    update: dict[str, str] | None = None
+
+def plan(existing_records: list[dict[str, str]], records: dict[str, str]) -> list[Operation]:
+    """Work out the smallest set of add/update/delete calls that turns a node's
+    rewrite list into our records. Changed answers become a single update."""
+    operations, matched = [], set()
+
+    # Keep the first record that already matches our database
+    kept = set()
+    for index, record in enumerate(existing_records):
+        if record["domain"] not in matched and records.get(record["domain"]) == record["answer"]:
+            matched.add(record["domain"])
+            kept.add(index)
+
+    # Rewrite mismatched records in place, remove everything else
+    for index, record in enumerate(existing_records):
+        if index in kept:
+            continue
+
+        domain = record["domain"]
+        if domain in records and domain not in matched:
+            operations.append(Operation("update", record, record | {"answer": records[domain]}))
+            matched.add(domain)
+
+        else:
+            operations.append(Operation("delete", record))
+
+    # Handle new records
+    for domain, answer in records.items():
+        if domain not in matched:
+            operations.append(Operation("add", {"domain": domain, "answer": answer}))
+
+    return operations
+
+def apply(node: Node, operations: list[Operation]) -> tuple[int, int, int]:
+    for operation in operations:
+        match operation.action:
+            case "add":
+                node.add_record(operation.record)
+
+            case "update":
+                node.update_record(operation.record, operation.update)  # type: ignore
+
+            case "delete":
+                node.del_record(operation.record)
+
+    return tuple(sum(operation.action == action for operation in operations) for action in ("add", "delete", "update"))  # type: ignore
+
 # Handle synchronization
+def sync_node(node: Node, records: dict[str, str]) -> tuple[int, int, int]:
+    try:
+        result = apply(node, plan(node.get_records(), records))
+
+    except RequestError:
+        journal.invalidate(node.name)
+        raise
+
+    journal.confirm(node.name, fingerprint(records))
+    return result
+
+def push_node(node: Node, records: dict[str, str]) -> tuple[int, int, int]:
+    pending = journal.pending(node.name)
+    if pending is None:
+        return sync_node(node, records)
+
+    # Replay only what changed since the node was last confirmed
+    operations = [Operation(*operation) for operation in pending]
+    try:
+        for operation in operations:
+            apply(node, [operation])
+            journal.advance(node.name)
+
+    except RequestError:
+        return sync_node(node, records)
+
+    journal.confirm(node.name, fingerprint(records))
+    return tuple(sum(operation.action == action for operation in operations) for action in ("add", "delete", "update"))  # type: ignore
+
+def write_metrics() -> None:
+    directory = config.get_option("metrics_dir", str(config.file.parent))
+    if directory:
+        metrics.write(Path(directory))
+
+def report(nodes: list[Node], callback: typing.Callable[[Node], tuple[int, int, int]]) -> None:
+    longest_node_name = len(max(nodes, key = lambda node: len(node.name)).name)
+    for node, future in parallel(nodes, callback):
+        print(f"    {node.name}{' ' * (longest_node_name - len(node.name))}...", end = "", flush = True)
+
+        result, elapsed = future.result()
+        if isinstance(result, RequestError):
+            print(f"\033[31m\tFAIL \033[90m({result}, {elapsed:.2f}s)")
+            continue
+
+        added, removed, updated = result
+        print(f"\033[32m\tOK \033[90m(added: {added}, removed: {removed}, updated: {updated}, {elapsed:.2f}s)")
+
+    journal.save()
+    write_metrics()
+
 def sync(nodes: list[Node], records: dict[str, str]) -> None:
     print("\033[90mAttempting to sync records")
+    report(nodes, lambda node: sync_node(node, records))
 
-    longest_node_name = len(max(nodes, key = lambda node: len(node.name)).name)
+def push(nodes: list[Node], previous: dict[str, str], records: dict[str, str]) -> None:
+    """Send the change from previous to records, only reconciling nodes in an unknown state."""
+    operations = plan([{"domain": domain, "answer": answer} for domain, answer in previous.items() if records.get(domain) != answer], {
+        domain: answer for domain, answer in records.items() if previous.get(domain) != answer
+    })
+
+    before, after = fingerprint(previous), fingerprint(records)
     for node in nodes:
-        added, removed, updated = 0, 0, 0
-        print(f"    {node.name}{' ' * (longest_node_name - len(node.name))}...", end = "", flush = True)
+        journal.queue(node.name, operations, before, after)
 
-        try:
+    journal.save()
 
-            # Load existing records from node
-            existing_records = node.get_records()
-            for record in existing_records:
-                existing_answer = records.get(record["domain"])
+    print("\033[90mAttempting to push changes")
+    report(nodes, lambda node: push_node(node, records))
 
-                # Remove anything that doesn't match our database
-                mismatched = existing_answer != record["answer"]
-                if mismatched:
-                    if existing_answer is not None:
-                        node.add_record(record | {"answer": existing_answer})
-                        updated += 1
+def show_plan(nodes: list[Node], records: dict[str, str]) -> None:
+    print("\033[90mPlanning sync (nothing will be sent)")
 
-                    else:
-                        removed += 1
+    longest_node_name = len(max(nodes, key = lambda node: len(node.name)).name)
+    for node, future in parallel(nodes, lambda node: plan(node.get_records(), records)):
+        print(f"    {node.name}{' ' * (longest_node_name - len(node.name))}...", end = "", flush = True)
 
-                    node.del_record(record)
+        result, elapsed = future.result()
+        if isinstance(result, RequestError):
+            print(f"\033[31m\tFAIL \033[90m({result}, {elapsed:.2f}s)")
+            continue
 
-            # Handle new records
-            existing_records = {record["domain"]: record["answer"] for record in existing_records}
-            for domain, answer in records.items():
-                if domain in existing_records:
-                    continue
+        print(f"\033[32m\tOK \033[90m({len(result)} change(s), {elapsed:.2f}s)")
+        for operation in result:
+            match operation.action:
+                case "add":
+                    print(f"        \033[32m+ {operation.record['domain']} \033[90m⇀ {operation.record['answer']}")
 
-                node.add_record({"domain": domain, "answer": answer})
-                added += 1
+                case "update":
+                    print(f"        \033[33m~ {operation.record['domain']} \033[90m{operation.record['answer']} ⇀ {operation.update['answer']}")  # type: ignore
 
-            print(f"\033[32m\tOK \033[90m(added: {added}, removed: {removed}, updated: {updated})")
+                case "delete":
+                    print(f"        \033[31m- {operation.record['domain']} \033[90m⇀ {operation.record['answer']}")
 
-        except RequestError as e:
-            print(f"\033[31m\tFAIL \033[90m(HTTP {e})")
+    print("\033[0m", end = "")
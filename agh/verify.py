@@ -0,0 +1,219 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import time
+import random
+import struct
+import asyncio
+import ipaddress
+import statistics
+from urllib.parse import urlsplit
+
+from agh import config
+from agh.node import Node
+
+# DNS constants
+TYPE_A, TYPE_CNAME, TYPE_AAAA = 1, 5, 28
+
+# Handle packets
+def encode_name(domain: str) -> bytes:
+    return b"".join(bytes([len(label)]) + label.encode("idna") for label in domain.rstrip(".").split(".") if label) + b"\0"
+
+def decode_name(packet: bytes, offset: int) -> tuple[str, int]:
+    """Read a (possibly compressed) name, returning it and the offset just past it."""
+    labels, end = [], None
+    while True:
+        length = packet[offset]
+        if length & 0xc0 == 0xc0:
+            end = end or offset + 2
+            offset = struct.unpack_from("!H", packet, offset)[0] & 0x3fff
+            continue
+
+        if length == 0:
+            return ".".join(labels), end or offset + 1
+
+        labels.append(packet[offset + 1:offset + 1 + length].decode(errors = "replace"))
+        offset += length + 1
+
+def build_query(identifier: int, domain: str, qtype: int) -> bytes:
+    return struct.pack("!HHHHHH", identifier, 0x0100, 1, 0, 0, 0) + encode_name(domain) + struct.pack("!HH", qtype, 1)
+
+def parse_response(packet: bytes) -> tuple[int, int, list[tuple[int, str]]]:
+    """Returns (identifier, rcode, [(type, value), ...]) for the answer section."""
+    identifier, flags, questions, answers = struct.unpack_from("!HHHH", packet)
+    offset = 12
+    for _ in range(questions):
+        offset = decode_name(packet, offset)[1] + 4
+
+    records = []
+    for _ in range(answers):
+        offset = decode_name(packet, offset)[1]
+        rtype, _, _, length = struct.unpack_from("!HHIH", packet, offset)
+        offset += 10
+
+        data = packet[offset:offset + length]
+        match rtype:
+            case 1 | 28:
+                records.append((rtype, str(ipaddress.ip_address(data))))
+
+            case 5:
+                records.append((rtype, decode_name(packet, offset)[0]))
+
+        offset += length
+
+    return identifier, flags & 0xf, records
+
+# Handle expectations
+def expectation(domain: str, answer: str) -> tuple[str, int] | None:
+    """Work out what to ask for and which record type should come back, None if unverifiable."""
+    if answer in ["A", "AAAA"]:
+        return None  # Upstream passthrough, nothing of ours to check
+
+    query = domain.replace("*", "agh-verify", 1)
+    try:
+        return query, TYPE_AAAA if ipaddress.ip_address(answer).version == 6 else TYPE_A
+
+    except ValueError:
+        return query, TYPE_CNAME
+
+def matches(qtype: int, answer: str, records: list[tuple[int, str]]) -> bool:
+    if qtype == TYPE_CNAME:
+        return any(rtype == TYPE_CNAME and value.lower().rstrip(".") == answer.lower().rstrip(".") for rtype, value in records)
+
+    return any(rtype == qtype and ipaddress.ip_address(value) == ipaddress.ip_address(answer) for rtype, value in records)
+
+# Handle querying
+class Resolver(asyncio.DatagramProtocol):
+    """One UDP socket per node, matching responses back to queries by identifier."""
+    def __init__(self) -> None:
+        self.pending: dict[int, asyncio.Future] = {}
+        self.transport: asyncio.DatagramTransport | None = None
+        self.answered, self.error = 0, None
+
+    def fail(self, error: Exception) -> None:
+        """Give up on this node entirely, failing everything still waiting on it."""
+        self.error = error
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        try:
+            identifier, rcode, records = parse_response(data)
+
+        except (struct.error, IndexError, ValueError):
+            return
+
+        future = self.pending.pop(identifier, None)
+        if future is not None and not future.done():
+            self.answered += 1
+            future.set_result((rcode, records))
+
+    def error_received(self, exc: Exception) -> None:
+        if isinstance(exc, ConnectionRefusedError):
+            self.fail(exc)
+
+    async def query(self, domain: str, qtype: int, timeout: float, retries: int) -> tuple[int, list[tuple[int, str]]]:
+        if self.error is not None:
+            raise self.error
+
+        identifier = random.randrange(65536)
+        while identifier in self.pending:
+            identifier = random.randrange(65536)
+
+        # UDP gives no delivery guarantee, so retransmit like any other resolver would
+        packet = build_query(identifier, domain, TYPE_A if qtype == TYPE_CNAME else qtype)
+        future = self.pending[identifier] = asyncio.get_running_loop().create_future()
+        try:
+            for attempt in range(retries + 1):
+                self.transport.sendto(packet)  # type: ignore
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+                except asyncio.TimeoutError:
+                    if attempt < retries:
+                        continue
+
+                    # Nothing has ever come back, so stop waiting on a dead node
+                    if not self.answered:
+                        self.fail(asyncio.TimeoutError("no response from resolver"))
+
+                    raise
+
+            raise asyncio.TimeoutError
+
+        finally:
+            self.pending.pop(identifier, None)
+            if future.done() and not future.cancelled():
+                future.exception()  # Mark as retrieved, fail() may have set one after we stopped waiting
+
+def resolver_address(node: Node) -> tuple[str, int]:
+    address = urlsplit(f"//{node.resolver}" if node.resolver else node.url)
+    return address.hostname or "", (address.port if node.resolver else None) or 53
+
+async def verify_node(node: Node, records: dict[str, str], inflight: int, timeout: float, retries: int) -> tuple[list[float], list[tuple[str, str, str]]]:
+    """Returns (latencies, [(domain, expected, got), ...]) for a single node."""
+    loop, semaphore = asyncio.get_running_loop(), asyncio.Semaphore(inflight)
+    transport, resolver = await loop.create_datagram_endpoint(Resolver, remote_addr = resolver_address(node))
+
+    latencies, mismatches = [], []
+    async def check(domain: str, answer: str) -> None:
+        query, qtype = expectation(domain, answer)  # type: ignore
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                rcode, response = await resolver.query(query, qtype, timeout, retries)
+
+            except asyncio.TimeoutError:
+                if resolver.error is not None:
+                    raise resolver.error
+
+                return mismatches.append((domain, answer, "timeout"))
+
+            latencies.append(time.perf_counter() - start)
+
+        if not matches(qtype, answer, response):
+            got = ", ".join(value for _, value in response) or ("NXDOMAIN" if rcode == 3 else f"no answer (rcode {rcode})")
+            mismatches.append((domain, answer, got))
+
+    try:
+        await asyncio.gather(*[check(domain, answer) for domain, answer in records.items() if expectation(domain, answer)])
+
+    finally:
+        transport.close()
+
+    return latencies, mismatches
+
+async def verify_all(nodes: list[Node], records: dict[str, str]) -> list[tuple[list[float], list[tuple[str, str, str]]] | BaseException]:
+    inflight = max(1, int(config.get_option("dns_inflight", 128)))
+    timeout, retries = float(config.get_option("dns_timeout", 1)), int(config.get_option("dns_retries", 2))
+    return await asyncio.gather(*[verify_node(node, records, inflight, timeout, retries) for node in nodes], return_exceptions = True)
+
+def verify(nodes: list[Node], records: dict[str, str]) -> None:
+    checked = sum(expectation(domain, answer) is not None for domain, answer in records.items())
+    print(f"\033[90mVerifying {checked} record(s) over DNS")
+
+    start = time.perf_counter()
+    results = asyncio.run(verify_all(nodes, records))
+    elapsed = time.perf_counter() - start
+
+    longest_node_name = len(max(nodes, key = lambda node: len(node.name)).name)
+    for node, result in zip(nodes, results):
+        print(f"    {node.name}{' ' * (longest_node_name - len(node.name))}...", end = "")
+        if isinstance(result, BaseException):
+            print(f"\033[31m\tFAIL \033[90m({result})")
+            continue
+
+        latencies, mismatches = result
+        p50, p99 = (statistics.quantiles(latencies, n = 100)[index] * 1000 for index in (49, 98)) if len(latencies) > 1 else (sum(latencies) * 1000,) * 2
+        print(
+            (f"\033[31m\tFAIL \033[90m({len(mismatches)} mismatched, " if mismatches else "\033[32m\tOK \033[90m(")
+            + f"p50: {p50:.1f}ms, p99: {p99:.1f}ms)"
+        )
+        for domain, expected, got in sorted(mismatches):
+            print(f"        \033[33m{domain} \033[90mexpected {expected}, got \033[31m{got}")
+
+    print(f"\033[90mFinished in {elapsed:.2f}s\033[0m")
@@ -0,0 +1,77 @@
+# Copyright (c) 2025 iiPython
+
+# Modules
+import time
+
+from agh import config, journal
+from agh.node import Node, NodeList
+from agh.sync import apply, parallel, plan, write_metrics
+from agh.journal import fingerprint
+
+# Handle checking
+def check(node: Node, records: dict[str, str], target: str) -> tuple[int, int, int] | None:
+    """List the node once and only diff + push if its fingerprint has drifted from ours."""
+    node.policy.reset()
+    existing_records = node.get_records()
+    if len(existing_records) == len(records) and fingerprint({record["domain"]: record["answer"] for record in existing_records}) == target:
+        journal.confirm(node.name, target)
+        return None
+
+    try:
+        result = apply(node, plan(existing_records, records))
+
+    except Exception:
+        journal.invalidate(node.name)
+        raise
+
+    journal.confirm(node.name, target)
+    return result
+
+# Main loop
+def watch(node_list: NodeList) -> None:
+    interval = float(config.get_option("watch_interval", 60))
+    backoff_limit = float(config.get_option("watch_backoff", 900))
+    print(f"\033[90mWatching nodes every {interval:g}s (press Ctrl+C to stop)\033[0m")
+
+    stamp, records, target = None, {}, ""
+    failures, due = {}, {}
+    while True:
+
+        # Only reload the store when something actually changed it
+        if config.stamp() != stamp:
+            config.reload()
+            stamp, records = config.stamp(), config.get_records().copy()
+            target = fingerprint(records)
+
+        now = time.monotonic()
+        nodes = [node for node in node_list.all() if due.get(node.name, 0) <= now]
+        for node, future in parallel(nodes, lambda node: check(node, records, target)):
+            try:
+                result, elapsed = future.result()
+
+            # Anything unexpected (a non-JSON reply, a malformed record) only costs this node a retry
+            except Exception as e:
+                result, elapsed = e, 0.0
+
+            timestamp = time.strftime("%H:%M:%S")
+            if isinstance(result, Exception):
+                failures[node.name] = failures.get(node.name, 0) + 1
+                delay = min(interval * 2 ** (failures[node.name] - 1), backoff_limit)
+                due[node.name] = now + delay
+                print(f"\033[90m[{timestamp}] \033[33m{node.name} \033[31mFAIL \033[90m({str(result) or type(result).__name__}, retrying in {delay:g}s)\033[0m")
+                continue
+
+            failures.pop(node.name, None)
+            due[node.name] = now + interval
+            if result is not None:
+                added, removed, updated = result
+                print(f"\033[90m[{timestamp}] \033[33m{node.name} \033[32mreconciled \033[90m(added: {added}, removed: {removed}, updated: {updated}, {elapsed:.2f}s)\033[0m")
+
+        try:
+            journal.save()
+            write_metrics()
+
+        except Exception as e:
+            print(f"\033[90m[{time.strftime('%H:%M:%S')}] \033[31mFailed to save state \033[90m({str(e) or type(e).__name__})\033[0m")
+
+        time.sleep(max(0, min((due[node.name] for node in node_list.all() if node.name in due), default = now + interval) - time.monotonic()))
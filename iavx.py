@@ -2,16 +2,27 @@
 # iiPython AV1 Encoding Tool - IAVx v1.8
 
 # Modules
-import re
+import os
 import sys
 import json
+import time
+import socket
 import typing
+import ctypes
+import hashlib
+import select
+import shutil
+import struct
+import tempfile
 import subprocess
+from queue import Queue
 from pathlib import Path
+from collections import deque
+from threading import Condition, Lock, Thread
+from concurrent.futures import as_completed, ThreadPoolExecutor
 
-from rich.live import Live
 from rich.console import Console
-from rich.progress import MofNCompleteColumn, SpinnerColumn, TimeElapsedColumn, Progress
+from rich.progress import MofNCompleteColumn, SpinnerColumn, TextColumn, TimeElapsedColumn, Progress
 
 # Initialization
 ENCODE_VERSION = "10"
@@ -22,7 +33,6 @@ COMMAND_ARGUMENTS = [
 
     # Shut the fuck up
     "-hide_banner",
-    "-stats",
 
     # Handle input control
     "-i"             , "%i",
@@ -33,7 +43,6 @@ COMMAND_ARGUMENTS = [
     "-preset" , "%p",
     "-crf"    , "%c",
     "-aq-mode", "2" ,
-    "-vf"     , "showinfo",
 
     # 10 bit color encoding
     "-pix_fmt", "yuv420p10le",
@@ -50,21 +59,378 @@ COMMAND_ARGUMENTS = [
     "%o"
 ]
 
+PROBE_CACHE = Path.home() / ".cache/iavx/probe.json"
+SPOOL_DIRECTORY = Path.home() / ".cache/iavx/spool"
+TELEMETRY_LOG = Path.home() / ".cache/iavx/telemetry.jsonl"
+TELEMETRY_INTERVAL = 10  # Seconds between time series samples
+PROBE_LIMITS = ("500M", "500M")  # Fallback -analyzeduration/-probesize for awkward files
+MEDIA_EXTENSIONS = {".avi", ".m2ts", ".m4v", ".mkv", ".mov", ".mp4", ".mpg", ".ts", ".webm", ".wmv"}
+
+def argument(name: str, default: str | None = None) -> str | None:
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv[:-1] else default
+
+def number(value: str | None) -> float | None:
+    try:
+        return float(value)  # type: ignore
+
+    except (TypeError, ValueError):
+        return None  # FFmpeg reports N/A until it has a value
+
+def write_atomic(file: Path, content: str) -> None:
+    """Replace file with content, through a temporary file unique to this writer."""
+    with tempfile.NamedTemporaryFile("w", dir = file.parent, prefix = f".{file.name}.", suffix = ".tmp", delete = False) as handle:
+        handle.write(content)
+        os.fchmod(handle.fileno(), 0o644)  # mkstemp defaults to 0600
+
+    try:
+        Path(handle.name).replace(file)
+
+    except OSError:
+        Path(handle.name).unlink(missing_ok = True)
+        raise
+
+# Handle caching ffprobe results
+class ProbeCache:
+    def __init__(self, file: Path) -> None:
+        self.file, self.data = file, {}
+        if self.file.is_file():
+            try:
+                self.data = json.loads(self.file.read_text())
+
+            except json.JSONDecodeError:
+                pass
+
+    @staticmethod
+    def key(file: Path) -> tuple[str, list[int]]:
+        stat = file.stat()
+        return str(file.resolve()), [stat.st_size, stat.st_mtime_ns]
+
+    def get(self, file: Path) -> dict[str, typing.Any] | None:
+        path, signature = self.key(file)
+        entry = self.data.get(path)
+        return entry["probe"] if entry is not None and entry["signature"] == signature else None
+
+    def set(self, file: Path, probe: dict[str, typing.Any]) -> None:
+        path, signature = self.key(file)
+        self.data[path] = {"signature": signature, "probe": probe}
+
+    def save(self) -> None:
+        self.file.parent.mkdir(parents = True, exist_ok = True)
+        write_atomic(self.file, json.dumps(self.data))
+
 # IAVx
-RE_FFMPEG_STAT = re.compile(r"^frame=\s*(\d+)\s+fps=\s*([\d.]+).+size=\s*(\d+)KiB")
+class EncodeError(Exception):
+    pass
+
+# Handle whole media libraries
+class Library:
+    """Keeps a manifest of a media tree at its root. Directories whose mtime hasn't changed
+    are not listed again, and files already encoded by this version are never probed."""
+    def __init__(self, root: Path) -> None:
+        if not root.is_dir():
+            raise ValueError("Library mode needs a directory to work with!")
+
+        self.root, self.lock = root.resolve(), Lock()
+        self.file = self.root / ".iavx-library.json"
+        self.data = {"directories": {}, "encoded": {}}
+        if self.file.is_file():
+            try:
+                self.data = json.loads(self.file.read_text())
+
+            except json.JSONDecodeError:
+                pass
+
+        self.saved = json.dumps(self.data)
+
+    def save(self) -> None:
+        content = json.dumps(self.data)
+        if content != self.saved:
+            write_atomic(self.file, content)
+            self.saved = content
+
+    def walk(self) -> tuple[list[str], set[str]]:
+        """Return every source file in the tree, plus the directories that had to be listed again."""
+        directories, files, changed, stack = {}, [], set(), [""]
+        while stack:
+            relative = stack.pop()
+            try:
+                mtime = (self.root / relative).stat().st_mtime_ns
+
+            except FileNotFoundError:
+                continue
+
+            # Saving the manifest touches the root, so it's always listed again
+            if not relative:
+                mtime = 0
+
+            listing = self.data["directories"].get(relative)
+            if listing is None or listing["mtime"] != mtime or not relative:
+                names, subdirectories = [], []
+                with os.scandir(self.root / relative) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue  # Manifests, chunk directories, temporary files
+
+                        if entry.is_dir(follow_symlinks = False):
+                            subdirectories.append(entry.name)
+
+                        elif Path(entry.name).suffix.lower() in MEDIA_EXTENSIONS and "iipython v" not in entry.name.lower():
+                            names.append(entry.name)
+
+                listing = {"mtime": mtime, "files": sorted(names), "dirs": sorted(subdirectories)}
+                changed.add(relative)
+
+            directories[relative] = listing
+            files += [os.path.join(relative, name) for name in listing["files"]]
+            stack += [os.path.join(relative, name) for name in listing["dirs"]]
+
+        self.data["directories"] = directories
+        return sorted(files), changed
+
+    def pending(self, exclude: typing.Collection[Path] = ()) -> list[Path]:
+        files, changed = self.walk()
+        pending = []
+        for relative in files:
+            entry, file = self.data["encoded"].get(relative), self.root / relative
+            if file in exclude:
+                continue
+
+            # Only files in directories that changed could have been replaced
+            if entry is not None and entry["version"] == ENCODE_VERSION:
+                if os.path.dirname(relative) not in changed:
+                    continue
+
+                try:
+                    if entry["source"] == ProbeCache.key(file)[1]:
+                        continue
+
+                except FileNotFoundError:
+                    continue
+
+            # Encoded before the manifest existed, or by a run outside library mode
+            output_file = IAVx.output_path(file)
+            if output_file.is_file():
+                self.data["encoded"][relative] = {
+                    "source": ProbeCache.key(file)[1],
+                    "output": str(output_file.relative_to(self.root)),
+                    "version": ENCODE_VERSION,
+                    "settings": None,
+                    "finished": output_file.stat().st_mtime
+                }
+                continue
+
+            pending.append(file)
+
+        # Forget files that are gone
+        known = set(files)
+        self.data["encoded"] = {relative: entry for relative, entry in self.data["encoded"].items() if relative in known}
+        self.save()
+        return pending
+
+    def record(self, file: Path, output_file: Path, settings: dict[str, typing.Any]) -> None:
+        with self.lock:
+            # Files always come from pending() as root / relative, resolving would follow symlinks out of the library
+            self.data["encoded"][str(file.relative_to(self.root))] = {
+                "source": ProbeCache.key(file)[1],
+                "output": str(output_file.relative_to(self.root)),
+                "version": ENCODE_VERSION,
+                "settings": settings,
+                "finished": time.time()
+            }
+            self.save()
+
+class Inotify:
+    """Minimal inotify(7) binding, enough to notice new files showing up in a library."""
+    IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_ISDIR = 0x8, 0x80, 0x100, 0x40000000
+
+    def __init__(self) -> None:
+        self.libc = ctypes.CDLL(None, use_errno = True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise ValueError("inotify is not available on this system, cannot watch!")
+
+        self.fd, self.watches, self.watched = self.libc.inotify_init1(os.O_CLOEXEC), {}, set()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, directory: Path) -> None:
+        if directory in self.watched:
+            return
+
+        descriptor = self.libc.inotify_add_watch(self.fd, bytes(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE)
+        if descriptor >= 0:
+            self.watches[descriptor] = directory
+            self.watched.add(directory)
+
+    def read(self, timeout: float | None) -> list[tuple[Path, int]]:
+        """Wait up to timeout seconds for events and return (path, mask) pairs."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+
+        buffer, offset, events = os.read(self.fd, 65536), 0, []
+        while offset < len(buffer):
+            descriptor, mask, _, length = struct.unpack_from("iIII", buffer, offset)
+            name = buffer[offset + 16:offset + 16 + length].rstrip(b"\0").decode(errors = "surrogateescape")
+            if descriptor in self.watches:
+                events.append((self.watches[descriptor] / name, mask))
+
+            offset += 16 + length
+
+        return events
+
+class Stager:
+    """Copies upcoming sources to local scratch while earlier files encode, and moves finished
+    outputs back into place atomically. Each staged file reserves twice its size, covering the
+    copy and the output being written next to it."""
+    def __init__(self, directory: Path, files: list[Path], limit: int, bandwidth: float, depth: int) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents = True, exist_ok = True)
+        self.limit, self.bandwidth, self.depth = limit, bandwidth, depth
+        self.staged: dict[Path, Path | None] = {}
+        self.reserved: dict[Path, int] = {}
+        self.condition, self.stopped = Condition(), False
+        Thread(target = self.prefetch, args = (files,), daemon = True).start()
+
+    def local(self, file: Path) -> Path:
+        return self.directory / f"{hashlib.sha1(bytes(file.resolve().parent)).hexdigest()[:8]}-{file.name}"
+
+    def copy(self, source: Path, destination: Path) -> bool:
+        """Copy at no more than bandwidth bytes per second, giving up if staging gets stopped."""
+        started, copied = time.time(), 0
+        with source.open("rb") as reader, destination.open("wb") as writer:
+            while (block := reader.read(8 * 1024 * 1024)):
+                if self.stopped:
+                    break
+
+                writer.write(block)
+                copied += len(block)
+                if self.bandwidth and (ahead := copied / self.bandwidth - (time.time() - started)) > 0:
+                    time.sleep(ahead)
+
+            else:
+                writer.flush()
+                os.fsync(writer.fileno())
+                return True
+
+        destination.unlink(missing_ok = True)
+        return False
+
+    def prefetch(self, files: list[Path]) -> None:
+        for file in files:
+            local = file
+            try:
+                size = file.stat().st_size * 2
+                if size > self.limit:
+                    raise ValueError("too large to ever fit in scratch")
+
+                with self.condition:
+                    self.condition.wait_for(lambda: self.stopped or not self.reserved or (
+                        len(self.reserved) < self.depth and sum(self.reserved.values()) + size <= self.limit
+                    ))
+                    if self.stopped:
+                        return
+
+                    self.staged[file], self.reserved[file] = None, size
+
+                local = self.local(file)
+                if not self.copy(file, local):
+                    return
+
+            # Fall back to reading over the network if anything goes wrong, so stage() never waits forever
+            except Exception:
+                if local != file:
+                    local.unlink(missing_ok = True)
+
+                local = file
+
+            with self.condition:
+                self.staged[file] = local
+                if local == file:
+                    self.reserved.pop(file, None)
+
+                self.condition.notify_all()
+
+    def stage(self, file: Path) -> Path:
+        """Wait for file to be staged and return the path to read it from."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.stopped or self.staged.get(file) is not None)
+            return self.staged.get(file) or file
+
+    def target(self, file: Path, output_file: Path) -> Path:
+        """Where to write file's output, scratch only if file itself got staged and reserved room for it."""
+        with self.condition:
+            local = self.staged.get(file)
+            return self.local(output_file) if local is not None and local != file else output_file
+
+    def release(self, file: Path) -> None:
+        with self.condition:
+            local = self.staged.pop(file, None)
+            self.reserved.pop(file, None)
+            if local is not None and local != file:
+                local.unlink(missing_ok = True)
+
+            self.condition.notify_all()
+
+    def publish(self, local: Path, output_file: Path) -> bool:
+        """Move a finished output from scratch to its real location without a partial file ever showing up there."""
+        if local == output_file:
+            return True  # Written in place, source was never staged
+
+        if local.stat().st_dev == output_file.parent.stat().st_dev:
+            local.replace(output_file)
+            return True
+
+        temporary = output_file.with_name(f".{output_file.name}.tmp")
+        if not self.copy(local, temporary):
+            return False
+
+        temporary.replace(output_file)
+        local.unlink()
+        return True
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            for file, local in self.staged.items():
+                if local is not None and local != file:
+                    local.unlink(missing_ok = True)
+
+            self.condition.notify_all()
 
 class IAVx:
     def __init__(self, target: Path, console: Console) -> None:
         self.settings, self.console, self.debug = {}, console, "--debug" in sys.argv
 
+        # Scheduling
+        self.jobs, self.threads = int(argument("--jobs", "1")), int(argument("--threads", "0"))  # type: ignore
+        self.pin = "--pin" in sys.argv and self.threads > 0
+        if self.pin and shutil.which("taskset") is None:
+            raise ValueError("Pinning needs taskset (from util-linux) to be installed!")
+
+        self.chunked, self.chunk_length = "--chunked" in sys.argv, float(argument("--chunk-length", "0"))  # type: ignore
+        self.resume = "--resume" in sys.argv
+        self.telemetry = Path(argument("--telemetry", str(TELEMETRY_LOG)))  # type: ignore
+        self.chunked |= self.resume
+        self.processes: dict[Path, subprocess.Popen] = {}
+        self.first_frames: dict[Path, float] = {}
+        self.stager: Stager | None = None
+        self.failed: Path | None = None  # The file that raised the EncodeError ending the last batch
+        self.scratch: set[Path] = set()
+        self.lock, self.canceled = Lock(), False
+
         # Probe given target
-        try:
-            self.console.print("[bright_black]Probing for media information...")
+        self.library = Library(target) if "--library" in sys.argv else None
+        self.console.print("[bright_black]Probing for media information...")
+        if self.library is not None:
+            self.file_info = self.probe_paths(self.library.pending(), errors := [])
+            for file, reason in errors:
+                self.console.print(f"[red]  -> Skipping {file.relative_to(self.library.root)}, {reason}")
+
+        else:
             self.file_info = self.probe_target(target)
-        
-        except ValueError as e:
-            self.console.print(f"[red]  -> {e}")
-            return exit(1)
+
+        if not self.file_info:
+            self.console.print("[green]  -> Nothing left to encode\n")
+            return
 
         # Show file information
         selected_file = self.file_info[0][1]
@@ -75,9 +441,78 @@ class IAVx:
         # Begin the encoding process
         self.console.print()
 
-    def encode_all(self, settings: dict[str, str]) -> None:
-        self.settings = settings
-        [self.encode_file(file, metadata) for file, metadata in self.file_info]
+    def prepare(self, settings: dict[str, typing.Any]) -> Progress:
+        self.settings, self.canceled, self.failed = settings, False, None
+        self.scratch.clear()
+
+        # Each running job holds a slot, which decides the cores it gets pinned to
+        self.slots = Queue()
+        [self.slots.put(slot) for slot in range(self.jobs)]
+
+        return Progress(
+            SpinnerColumn(),
+            *Progress.get_default_columns(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            TextColumn("[bright_black]{task.fields[stats]}"),
+            console = self.console,
+            refresh_per_second = 2
+        )
+
+    def encode_all(self, settings: dict[str, typing.Any]) -> bool:
+        with self.prepare(settings) as self.progress, ThreadPoolExecutor(max_workers = 1 if self.chunked else self.jobs) as pool:
+
+            # Optionally stage sources and outputs on local scratch storage
+            if (scratch := argument("--scratch")) is not None:
+                Path(scratch).mkdir(parents = True, exist_ok = True)
+                self.stager = Stager(
+                    Path(scratch),
+                    [file for file, _ in self.file_info if not self.output_path(file).is_file()],
+                    int(float(argument("--scratch-limit", "0")) * 1_000_000_000) or int(shutil.disk_usage(scratch).free * 0.9),  # type: ignore
+                    float(argument("--bandwidth", "0")) * 1_000_000,  # type: ignore
+                    (1 if self.chunked else self.jobs) + 1
+                )
+
+            futures = {pool.submit(self.encode_chunked if self.chunked else self.encode_file, file, metadata): file for file, metadata in self.file_info}
+            try:
+                for future in as_completed(futures):
+                    self.failed = futures[future]
+                    future.result()
+
+                self.failed = None
+                if self.stager is not None:
+                    self.stager.stop()
+
+                return True
+
+            except (KeyboardInterrupt, EncodeError) as e:
+                pool.shutdown(wait = False, cancel_futures = True)
+                self.cancel()
+                if isinstance(e, KeyboardInterrupt):
+                    self.failed = None  # Nothing wrong with the file we were waiting on
+
+                self.progress.stop()
+                message = "Finished chunks were kept, run again to resume." if self.resume else "Any unfinished encodes have been deleted."
+                self.console.print(f"{f'[red]{e}\n' if str(e) else '\n'}[red][bold]Encoding canceled.[/] {message}", highlight = False)
+                if isinstance(e, KeyboardInterrupt):
+                    return exit(1)
+
+                return False
+
+    def cancel(self) -> None:
+        with self.lock:
+            self.canceled = True
+            for output_file, process in self.processes.items():
+                process.kill()
+                process.wait()
+                if output_file.is_file():
+                    output_file.unlink()
+
+            for directory in self.scratch:
+                shutil.rmtree(directory, ignore_errors = True)
+
+            if self.stager is not None:
+                self.stager.stop()
 
     @staticmethod
     def probe_file(file: Path) -> dict[str, typing.Any]:
@@ -96,44 +531,104 @@ class IAVx:
             key = lambda file: file.name
         )
 
+    @staticmethod
+    def probe_files(files: list[Path]) -> list[dict[str, typing.Any] | None]:
+        """Probe files in parallel, reusing cached results for anything unchanged since last time."""
+        cache = ProbeCache(PROBE_CACHE)
+        missing = [file for file in files if cache.get(file) is None]
+        if missing:
+            def probe(file: Path) -> dict[str, typing.Any] | None:
+                try:
+                    return IAVx.probe_file(file)
+
+                except (OSError, subprocess.CalledProcessError, json.JSONDecodeError):
+                    return None  # Unreadable, left uncached so it gets another go next time
+
+            with ThreadPoolExecutor(max_workers = min(len(missing), 16)) as pool:  # ffprobe mostly waits on I/O
+                for file, file_data in zip(missing, pool.map(probe, missing)):
+                    if file_data is not None:
+                        cache.set(file, file_data)
+
+            cache.save()
+
+        return [cache.get(file) if file.is_file() else None for file in files]
+
     @staticmethod
     def probe_target(target: Path) -> list[tuple[Path, dict[str, tuple]]]:
+        return IAVx.probe_paths(IAVx.scan_files(target))
+
+    @staticmethod
+    def probe_limits(file: Path, file_data: dict[str, typing.Any]) -> tuple[str, str]:
+        """Work out how much of a file FFmpeg needs to read before it knows every stream.
+        Most files only need a few seconds, the full 500M is kept for late or incomplete streams."""
+        for stream in file_data["streams"]:
+            incomplete = not stream.get("codec_name") or (stream["codec_type"] == "audio" and stream.get("sample_rate") in (None, "0")) \
+                or (stream["codec_type"] == "video" and not stream.get("height"))
+
+            if incomplete:
+                return PROBE_LIMITS
+
+        # Cover the latest starting stream, plus some headroom
+        starts = [float(stream.get("start_time", 0)) for stream in file_data["streams"]]
+        seconds = max(starts) - min(starts) + 5 if starts else 5
+        if seconds > 60:
+            return PROBE_LIMITS
+
+        rate = file.stat().st_size / max(float(file_data["format"]["duration"]), 1)
+        return str(int(seconds * 1_000_000)), str(min(max(int(rate * seconds), 5_000_000), 500_000_000))
+
+    @staticmethod
+    def probe_paths(files: list[Path], errors: list[tuple[Path, str]] | None = None) -> list[tuple[Path, dict[str, tuple]]]:
+        """Turn probes into file info. If errors is given, files that can't be encoded
+        are skipped and added to it, otherwise the first one aborts with a ValueError."""
         file_info = []
-        for file in IAVx.scan_files(target):
-            file_data = IAVx.probe_file(file)
-
-            # Find stream info
-            video_streams = [s for s in file_data["streams"] if s["codec_type"] == "video"]
-            if not video_streams:
-                raise ValueError("At least one file is missing a video stream, cannot continue!")
-
-            if len(video_streams) > 1:
-                raise ValueError("At least one file contains multiple video streams. This is unsupported and we cannot continue!")
-
-            # Process st ream info
-            video_stream = video_streams[0]
-            file_info.append((file, {
-                "video": (
-                    video_stream["height"],
-                    round((lambda x, y: x / y)(*[int(x) for x in video_stream["avg_frame_rate"].split("/")]), 2),  # type: ignore
-                    video_stream["codec_name"].upper(),
-                    int(float(file_data["format"]["duration"]))
-                ),
-                "audio": [
-                    (index + 1, audio["codec_name"].upper(), audio["sample_fmt"][1:], audio["sample_rate"], audio["channel_layout"], audio.get("tags", {}).get("title", "untitled"))
-                    for index, audio in enumerate([s for s in file_data["streams"] if s["codec_type"] == "audio"])
-                ]
-            }))
-        
+        for file, file_data in zip(files, IAVx.probe_files(files)):
+            try:
+                if file_data is None:
+                    raise ValueError("ffprobe could not read it")
+
+                # Find stream info
+                video_streams = [s for s in file_data["streams"] if s["codec_type"] == "video"]
+                if not video_streams:
+                    raise ValueError("it is missing a video stream")
+
+                if len(video_streams) > 1:
+                    raise ValueError("it contains multiple video streams, which is unsupported")
+
+                # Process st ream info
+                video_stream = video_streams[0]
+                file_info.append((file, {
+                    "video": (
+                        video_stream["height"],
+                        round((lambda x, y: x / y)(*[int(x) for x in video_stream["avg_frame_rate"].split("/")]), 2),  # type: ignore
+                        video_stream["codec_name"].upper(),
+                        int(float(file_data["format"]["duration"]))
+                    ),
+                    "limits": IAVx.probe_limits(file, file_data),
+                    "audio": [
+                        (index + 1, audio["codec_name"].upper(), audio["sample_fmt"][1:], audio["sample_rate"], audio["channel_layout"], audio.get("tags", {}).get("title", "untitled"))
+                        for index, audio in enumerate([s for s in file_data["streams"] if s["codec_type"] == "audio"])
+                    ]
+                }))
+
+            except (KeyError, ValueError, ZeroDivisionError, OSError) as e:
+                reason = f"ffprobe didn't report {e}" if isinstance(e, KeyError) else str(e)
+                if errors is None:
+                    raise ValueError(f"Cannot encode {file.name}, {reason}. Cannot continue!")
+
+                errors.append((file, reason))
+
         return file_info
 
-    def encode_file(self, file: Path, metadata: dict[str, typing.Any]) -> None:
-        output_file = file.with_name(f"{file.with_suffix('').name} (iiPython v{ENCODE_VERSION})").with_suffix(".mkv")
-        if output_file.is_file():
-            return  # File already encoded
+    @staticmethod
+    def output_path(file: Path) -> Path:
+        return file.with_name(f"{file.with_suffix('').name} (iiPython v{ENCODE_VERSION})").with_suffix(".mkv")
+
+    def build_arguments(self, file: Path, output_file: Path, metadata: dict[str, typing.Any]) -> list[str]:
 
         # Process command arguments
         arguments = COMMAND_ARGUMENTS.copy()
+        arguments[arguments.index("-analyzeduration") + 1], arguments[arguments.index("-probesize") + 1] = metadata["limits"]
         for key, value in {
             "i": file,
             "o": output_file,
@@ -142,8 +637,15 @@ class IAVx:
         }.items():
             arguments[arguments.index(f"%{key}")] = str(value)
 
+        arguments[arguments.index("libopus") + 1:arguments.index("libopus") + 1] = self.settings["audio"]
+        arguments[arguments.index("comment=")] += f"SVT-AV1 / CRF {self.settings['crf']} / Preset {self.settings['preset']}"
+
         if self.settings["ivtc"].lower() in ["yes", "y"]:
-            arguments[arguments.index("showinfo")] += ",yadif=mode=0:parity=tff,fieldmatch=order=tff,decimate"
+            arguments[arguments.index("-pix_fmt"):arguments.index("-pix_fmt")] = ["-vf", "yadif=mode=0:parity=tff,fieldmatch=order=tff,decimate"]
+
+        # Give each job its own thread budget
+        if self.threads:
+            arguments[arguments.index("-aq-mode"):arguments.index("-aq-mode")] = ["-svtav1-params", f"lp={self.threads}"]
 
         if self.debug:
             index = 0
@@ -157,66 +659,434 @@ class IAVx:
 
             self.console.print()
 
+        return arguments
+
+    def run(
+        self,
+        arguments: list[str],
+        output_file: Path,
+        task: typing.Any,
+        update: typing.Callable[[float], None],
+        sample: typing.Callable[[dict[str, typing.Any]], None] | None = None
+    ) -> bool:
+        """Run one FFmpeg process in a free job slot, passing encoded seconds to update
+        and, every TELEMETRY_INTERVAL seconds, a stats snapshot to sample.
+        Returns False if the batch got canceled while it was running."""
+        slot = self.slots.get()
+        try:
+            with self.lock:
+                if self.canceled:
+                    return False
+
+                # Pin to this slot's cores through taskset, so ffmpeg and all of its worker threads start there
+                cpus = sorted(os.sched_getaffinity(0))
+                cpus = cpus[slot * self.threads:(slot + 1) * self.threads] or cpus
+                prefix = ["taskset", "-c", ",".join(str(cpu) for cpu in cpus)] if self.pin else []
+
+                # Progress comes in as key=value blocks on stdout, logging stays on stderr
+                self.first_frames.pop(output_file, None)
+                process = self.processes[output_file] = subprocess.Popen(
+                    [*prefix, arguments[0], "-nostats", "-progress", "pipe:1", *arguments[1:]],
+                    stdout = subprocess.PIPE,
+                    stderr = subprocess.PIPE,
+                    text = True
+                )
+
+            if process.stdout is None or process.stderr is None:
+                raise RuntimeError("No stdout/stderr object returned by Popen!")
+
+            log = deque(maxlen = 10)
+            logger = Thread(target = self.read_log, args = (process.stderr, log), daemon = True)
+            logger.start()
+
+            launched = time.time()
+
+            # Each block ends with progress=continue or progress=end
+            block, sampled = {}, 0.0
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                if key != "progress":
+                    block[key] = value
+                    continue
+
+                if sample is not None and (time.time() - sampled >= TELEMETRY_INTERVAL or value == "end"):
+                    sample({
+                        "frame": number(block.get("frame")),
+                        "fps": number(block.get("fps")),
+                        "speed": number(block.get("speed", "").removesuffix("x")),
+                        "size": number(block.get("total_size"))
+                    })
+                    sampled = time.time()
+
+                if block.get("out_time_us", "N/A") != "N/A":
+                    update(max(int(block["out_time_us"]), 0) / 1_000_000)
+
+                # Time to first frame, mostly spent probing the input
+                if output_file not in self.first_frames and (number(block.get("frame")) or 0) > 0:
+                    self.first_frames[output_file] = time.time()
+
+                if block.get("total_size", "N/A") != "N/A":
+                    first_frame = f"First frame: {self.first_frames[output_file] - launched:.1f}s | " if output_file in self.first_frames else ""
+                    self.progress.update(task, stats = f"{first_frame}Frame: {block.get('frame')} | FPS: {block.get('fps')} | Filesize: {int(block['total_size']) / 1_000_000:.2f}MB")
+
+                block = {}
+
+            process.wait()
+            logger.join()
+            if output_file in self.first_frames:
+                self.first_frames[output_file] -= launched
+
+            with self.lock:
+                del self.processes[output_file]
+                if self.canceled:
+                    return False
+
+                # Never leave a partial encode behind, it would look finished next time
+                if process.returncode != 0:
+                    output_file.unlink(missing_ok = True)
+                    raise EncodeError(f"FFmpeg exited with code {process.returncode} while writing {output_file.name}" + (f": {log[-1]}" if log else ""))
+
+            return True
+
+        finally:
+            self.slots.put(slot)
+
+    def finished(self, file: Path, metadata: dict[str, typing.Any], output_file: Path, started: float, series: list[dict[str, typing.Any]], first_frame: float | None) -> None:
+        self.log_encode(file, metadata, output_file, started, series, first_frame)
+        if self.library is not None:
+            self.library.record(file, output_file, self.settings)
+
+    def log_encode(self, file: Path, metadata: dict[str, typing.Any], output_file: Path, started: float, series: list[dict[str, typing.Any]], first_frame: float | None) -> None:
+        """Append a summary of a finished encode, along with its time series, to the telemetry log."""
+        wall, source_size = time.time() - started, file.stat().st_size
+        height, fps, codec, duration = metadata["video"]
+
+        # Count frames actually encoded in this run, chunks finished before a --resume never show up in the series
+        frames = {entry.get("chunk"): entry["frame"] for entry in series if entry.get("frame") is not None}
+        record = {
+            "file": str(file.resolve()),
+            "output": str(output_file.resolve()),
+            "finished": time.time(),
+            "wall": round(wall, 2),
+            "duration": duration,
+            "average_fps": round((sum(frames.values()) if frames else duration * fps) / wall, 2),
+            "first_frame": round(first_frame, 2) if first_frame is not None else None,
+            "limits": metadata["limits"],
+            "source_size": source_size,
+            "output_size": output_file.stat().st_size,
+            "ratio": round(output_file.stat().st_size / source_size, 4) if source_size else None,
+            "codec": codec,
+            "height": height,
+            "settings": {key: self.settings[key] for key in ["preset", "crf", "ivtc"]} | {
+                "jobs": self.jobs,
+                "threads": self.threads,
+                "chunked": self.chunked
+            },
+            "series": series
+        }
+        with self.lock:
+            self.telemetry.parent.mkdir(parents = True, exist_ok = True)
+            with self.telemetry.open("a") as handle:
+                handle.write(json.dumps(record) + "\n")
+
+    def read_log(self, stream: typing.IO[str], log: deque) -> None:
+        for line in stream:
+            line = line.strip()
+            if line:
+                log.append(line)
+
+            # Log every line in debug mode
+            if self.debug:
+                self.progress.console.print(f"  [bright_black]\\[Debug, FFmpeg] {line}", highlight = False)
+
+    def encode_file(self, file: Path, metadata: dict[str, typing.Any]) -> None:
+        output_file = self.output_path(file)
+        if output_file.is_file():
+            return  # File already encoded
+
         # Launch FFmpeg
-        with Progress(
-            SpinnerColumn(),
-            *Progress.get_default_columns(),
-            MofNCompleteColumn(),
-            TimeElapsedColumn()
-        ) as progress:
-            task = progress.add_task(f"[cyan]Encoding [bold]{file.name}", total = metadata["video"][-1])
+        task = self.progress.add_task(f"[cyan]{'Staging' if self.stager else 'Encoding'} [bold]{file.name}", total = metadata["video"][-1], stats = "")
+        started, series = time.time(), []
+        try:
+            source, target = (self.stager.stage(file), self.stager.target(file, output_file)) if self.stager else (file, output_file)
+            self.progress.update(task, description = f"[cyan]Encoding [bold]{file.name}")
+            if self.run(
+                self.build_arguments(source, target, metadata), target, task,
+                lambda seconds: self.progress.update(task, completed = round(seconds)),
+                lambda sample: series.append({"time": round(time.time() - started, 1)} | sample)
+            ):
+                if self.stager is not None and not self.stager.publish(target, output_file):
+                    return
 
-            # Begin encoding
-            with subprocess.Popen(arguments, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, text = True) as process, Live() as live:
-                if process.stdout is None:
-                    raise RuntimeError("No stdout object returned by Popen!")
+                self.finished(file, metadata, output_file, started, series, self.first_frames.get(target))
+                self.progress.console.print(f"[green]  -> Encoded {file.name} [bright_black](first frame after {self.first_frames.get(target, 0):.1f}s)")
 
-                try:
-                    for line in process.stdout:
-                        line = line.strip()
+        finally:
+            self.progress.remove_task(task)
+            if self.stager is not None:
+                self.stager.release(file)
+
+    @staticmethod
+    def save_state(directory: Path, state: dict[str, typing.Any]) -> None:
+        temporary = directory / ".state.json.tmp"
+        temporary.write_text(json.dumps(state))
+        temporary.replace(directory / "state.json")
+
+    def encode_chunked(self, file: Path, metadata: dict[str, typing.Any]) -> None:
+        output_file = self.output_path(file)
+        if output_file.is_file():
+            return  # File already encoded
 
-                        # Handle FFmpeg errors
-                        if "setting option" in line:
-                            raise KeyboardInterrupt(f"FFmpeg exception: \\{line}")
+        try:
+            if self.stager is None:
+                return self.encode_chunks(file, metadata, file, output_file)
 
-                        # Log every line in debug mode
-                        if self.debug:
-                            self.console.print(f"  [bright_black]\\[Debug, FFmpeg] {line.removesuffix('\n')}")
+            self.encode_chunks(file, metadata, self.stager.stage(file), self.stager.target(file, output_file))
 
-                        # Check progress
-                        if "pts_time" in line:
-                            progress.update(task, completed = round(float(line.split("pts_time:")[1].split("duration")[0].strip())))
+        finally:
+            if self.stager is not None:
+                self.stager.release(file)
 
-                        else:
-                            stats = RE_FFMPEG_STAT.search(line)
-                            if stats:
-                                frame, fps, size = stats.groups()
-                                live.update(f"  [bright_black]-> Frame: {frame} | FPS: {fps} | Filesize: {int(size) * 0.001024:.2f}MB")
+    def encode_chunks(self, file: Path, metadata: dict[str, typing.Any], source: Path, target: Path) -> None:
+        """Split the video stream at keyframes, encode the pieces in parallel and then
+        concatenate them back together with the source's audio and subtitle streams.
+        Reads from source and writes to target, which differ from file when staging."""
+        output_file = self.output_path(file)
+        arguments, duration = self.build_arguments(source, target, metadata), metadata["video"][-1]
+        video_arguments = arguments[arguments.index("-c:v"):arguments.index("-c:a")]
+        directory = target.with_name(f".{target.stem}.chunks")
 
-                    progress.update(task, completed = metadata["video"][-1], description = f"[green]Encoded {file.name}")
-                    [live.stop() for live in (progress, live)]
+        # Pick up where a previous run left off, as long as the source and settings still match
+        state = {"source": ProbeCache.key(file)[1], "video": video_arguments, "length": 0, "split": False, "done": []}
+        if self.resume and (directory / "state.json").is_file():
+            try:
+                previous = json.loads((directory / "state.json").read_text())
+                if previous["source"] == state["source"] and previous["video"] == state["video"]:
+                    state = previous
 
-                except KeyboardInterrupt as e:
-                    process.kill()
-                    if output_file.is_file():
-                        output_file.unlink()
+            except (json.JSONDecodeError, KeyError):
+                pass
 
-                    [live.stop() for live in (progress, live)]
-                    self.console.print(f"{f'[red]{e}\n' if str(e) else '\n'}[red][bold]Encoding canceled.[/] Any unfinished encodes have been deleted.", highlight = False)
+        if not state["split"]:
+            shutil.rmtree(directory, ignore_errors = True)
+            directory.mkdir()
 
-                    return exit(1)
+        if not self.resume:
+            self.scratch.add(directory)
 
-if __name__ == "__main__":
-    console = Console()
-    console.print(f"[bold blue]iiPython AV1 Encoding System v1.{ENCODE_VERSION}\n")
+        task = self.progress.add_task(f"[cyan]Splitting [bold]{file.name}", total = duration, stats = "")
+        started, series = time.time(), []
+        try:
+
+            # Losslessly cut at the first keyframe after each boundary
+            length = state["length"] or self.chunk_length or max(duration / (self.jobs * 4), 60)
+            if not state["split"]:
+                boundaries = ",".join(str(round(length * index, 3)) for index in range(1, int(duration // length) + 1))
+                if not self.run([
+                    "ffmpeg", "-hide_banner", "-loglevel", "error", *arguments[1:arguments.index("-hide_banner")],
+                    "-i", str(source), "-map", "0:v:0", "-c", "copy",
+                    *(["-f", "segment", "-segment_times", boundaries] if boundaries else ["-f", "segment", "-segment_time", str(duration + 1)]),
+                    "-reset_timestamps", "1", str(directory / "source_%04d.mkv")
+                ], directory / "source_0000.mkv", task, lambda _: None):
+                    return
+
+                state["length"], state["split"] = length, True
+                self.save_state(directory, state)
+
+            # Encode every chunk with the same video settings, no audio or subtitles
+            sources = sorted(directory.glob("source_*.mkv"))
+            progress = [min(length, duration - length * index) if source.name in state["done"] else 0.0 for index, source in enumerate(sources)]
+
+            def encode_chunk(index: int, source: Path) -> bool:
+                if source.name in state["done"]:
+                    return True
+
+                def update(seconds: float) -> None:
+                    progress[index] = seconds
+                    self.progress.update(task, completed = round(sum(progress)))
+
+                chunk = source.with_name(source.name.replace("source_", "chunk_"))
+                if not self.run([
+                    "ffmpeg", "-hide_banner", "-i", str(source), "-map", "0:v:0",
+                    *video_arguments, "-an", "-sn", "-y", str(chunk)
+                ], chunk, task, update, lambda sample: series.append({"time": round(time.time() - started, 1), "chunk": index} | sample)):
+                    return False
+
+                # Checkpoint, a chunk only counts once it's listed here
+                with self.lock:
+                    state["done"].append(source.name)
+                    self.save_state(directory, state)
+
+                return True
+
+            self.progress.update(task, description = f"[cyan]Encoding [bold]{file.name} [/]({len(sources)} chunks)", completed = round(sum(progress)))
+            with ThreadPoolExecutor(max_workers = self.jobs) as pool:
+                if not all(pool.map(encode_chunk, range(len(sources)), sources)):
+                    return
+
+            # Stitch the chunks back together alongside the original audio and subtitles
+            (directory / "chunks.txt").write_text("".join(f"file '{source.name.replace('source_', 'chunk_')}'\n" for source in sources))
+            self.progress.update(task, description = f"[cyan]Muxing [bold]{file.name}")
+            if not self.run([
+                "ffmpeg", "-hide_banner", "-f", "concat", "-safe", "0", "-i", str(directory / "chunks.txt"),
+                *arguments[1:arguments.index("-hide_banner")], "-i", str(source), "-map", "0:v", "-map", "1", "-map", "-1:v", "-c:v", "copy",
+                *arguments[arguments.index("-c:a"):]
+            ], target, task, lambda _: None):
+                return
+
+            if self.stager is not None and not self.stager.publish(target, output_file):
+                return
+
+            shutil.rmtree(directory, ignore_errors = True)
+            self.finished(file, metadata, output_file, started, series, self.first_frames.get(target))
+            self.progress.console.print(f"[green]  -> Encoded {file.name}")
+
+        finally:
+            self.progress.remove_task(task)
+
+    def estimate(self, settings: dict[str, typing.Any]) -> None:
+        """Encode a few short samples for each preset/CRF pair and project the full batch from them."""
+        samples, length = int(argument("--samples", "3")), float(argument("--sample-length", "10"))  # type: ignore
+        presets = (argument("--presets") or settings["preset"]).split(",")  # type: ignore
+        crfs = (argument("--crfs") or settings["crf"]).split(",")  # type: ignore
+
+        # Sample a handful of files spread across the batch rather than every episode
+        count = min(int(argument("--sample-files", "4")), len(self.file_info))  # type: ignore
+        picked = [self.file_info[round(index * (len(self.file_info) - 1) / max(count - 1, 1))] for index in range(count)]
+        total = sum(metadata["video"][-1] for _, metadata in self.file_info)
+
+        # Evenly spaced windows, skipping the very start and end of each file
+        windows = []
+        for file, metadata in picked:
+            duration = metadata["video"][-1]
+            span = min(length, duration / samples)
+            windows += [(file, metadata, max(duration * (index + 1) / (samples + 1) - span / 2, 0), span) for index in range(samples)]
+
+        results = []
+        with self.prepare(settings) as self.progress, tempfile.TemporaryDirectory(prefix = "iavx-") as directory, ThreadPoolExecutor(max_workers = self.jobs) as pool:
+            try:
+                for preset in presets:
+                    for crf in crfs:
+                        self.settings = settings | {"preset": preset, "crf": crf}
+                        task = self.progress.add_task(f"[cyan]Sampling [bold]preset {preset} / CRF {crf}", total = len(windows), stats = "")
+
+                        def encode_sample(index: int) -> tuple[int, float]:
+                            file, metadata, start, span = windows[index]
+                            output_file = Path(directory) / f"sample_{index:04d}.mkv"
+                            arguments = self.build_arguments(file, output_file, metadata)
+                            arguments[arguments.index("-i"):arguments.index("-i")] = ["-ss", f"{start:.3f}", "-t", f"{span:.3f}"]
+                            if not self.run(arguments, output_file, task, lambda _: None):
+                                return 0, 0.0
+
+                            self.progress.advance(task)
+                            size = output_file.stat().st_size
+                            output_file.unlink()
+                            return size, span
+
+                        # Run the samples the same way a real batch would, across every job slot
+                        started = time.time()
+                        measured = list(pool.map(encode_sample, range(len(windows))))
+
+                        elapsed, seconds = time.time() - started, sum(span for _, span in measured)
+                        rate = sum(size for size, _ in measured) / seconds
+                        fps = sum(metadata["video"][1] * span for _, metadata, _, span in windows) / elapsed
+                        results.append((preset, crf, fps, rate * total, rate * 8 / 1000, total * elapsed / seconds))
+                        self.progress.remove_task(task)
+
+            except (KeyboardInterrupt, EncodeError) as e:
+                pool.shutdown(wait = False, cancel_futures = True)
+                self.cancel()
+
+                self.progress.stop()
+                self.console.print(f"{f'[red]{e}\n' if str(e) else '\n'}[red][bold]Estimate canceled.", highlight = False)
+                return exit(1)
 
-    # Initialization
-    iavx = IAVx(Path(sys.argv[1]), console)
+        # Report
+        self.console.print(f"[yellow]Estimates for {len(self.file_info)} file(s), {total / 3600:.1f} hours of video ({len(windows)} samples of up to {length:g}s each)\n")
+        for preset, crf, fps, size, bitrate, eta in results:
+            self.console.print(
+                f"  [bright_black]Preset [bold blue]{preset:>2}[/] / CRF [bold blue]{crf:>2}[/] -> "
+                f"[/][green]{fps:.1f} fps[/], [green]{size / 1_000_000_000:.2f} GB[/] total "
+                f"({bitrate:.0f} kbps), ETA [green]{int(eta // 3600)}h {int(eta % 3600 // 60):02d}m",
+                highlight = False
+            )
 
-    # Process settings
+# Handle the shared job spool
+class Spool:
+    """A directory based job queue, safe to share between hosts over a network filesystem.
+    Jobs move queue -> claimed -> results, each move being an atomic rename."""
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        for name in ["queue", "claimed", "results", "workers"]:
+            (directory / name).mkdir(parents = True, exist_ok = True)
+
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+
+    @staticmethod
+    def write(file: Path, data: dict[str, typing.Any]) -> None:
+        write_atomic(file, json.dumps(data, indent = 4))
+
+    def submit(self, file: Path, settings: dict[str, typing.Any]) -> str:
+        job = f"{time.time_ns()}-{os.getpid()}-{file.stem[:32].replace(' ', '_')}"
+        self.write(self.directory / "queue" / f"{job}.json", {"file": str(file.resolve()), "settings": settings, "submitted": time.time()})
+        return job
+
+    def claim(self) -> Path | None:
+        for job in sorted((self.directory / "queue").glob("*.json")):
+            claimed = self.directory / "claimed" / job.name
+            try:
+                job.rename(claimed)
+                os.utime(claimed)
+                return claimed
+
+            except FileNotFoundError:
+                continue  # Another worker got there first
+
+        return None
+
+    def requeue(self, claimed: Path) -> None:
+        try:
+            claimed.rename(self.directory / "queue" / claimed.name)
+
+        except FileNotFoundError:
+            pass
+
+    def requeue_stale(self, timeout: float) -> None:
+        """Return jobs whose worker stopped sending heartbeats to the queue."""
+        for claimed in (self.directory / "claimed").glob("*.json"):
+            try:
+                if time.time() - claimed.stat().st_mtime > timeout:
+                    self.requeue(claimed)
+
+            except FileNotFoundError:
+                pass
+
+    def heartbeat(self, claimed: Path | None) -> None:
+        if claimed is not None:
+            try:
+                os.utime(claimed)
+
+            except FileNotFoundError:
+                pass
+
+        self.write(self.directory / "workers" / f"{self.worker}.json", {
+            "job": claimed and claimed.stem,
+            "updated": time.time()
+        })
+
+    def finish(self, claimed: Path, job: dict[str, typing.Any], success: bool, started: float) -> None:
+        self.write(self.directory / "results" / claimed.name, job | {
+            "worker": self.worker,
+            "success": success,
+            "started": started,
+            "finished": time.time()
+        })
+        claimed.unlink(missing_ok = True)
+
+def prompt_settings(console: Console, iavx: IAVx) -> dict[str, typing.Any]:
     console.print("[yellow]Encode Settings\n\n  [yellow]Video Track")
 
-    settings = {}
+    settings = {"audio": []}
     for id, name, default in [("preset", "SVT-AV1 Preset", "4"), ("crf", "CRF", "24"), ("ivtc", "Inverse Telecine?", "no")]:
         value = console.input(f"    [bright_black]{name} ({default}) -> ") or default
 
@@ -227,7 +1097,7 @@ if __name__ == "__main__":
         settings[id] = value
 
     # Fetch audio channel settings
-    for index in range(len(iavx.file_info[0][1]["audio"])):
+    for index in range(len(iavx.file_info[0][1]["audio"]) if iavx.file_info else 0):
         console.print(f"\n  [yellow]Audio Track #{index + 1}")
 
         # Handle settings
@@ -239,27 +1109,194 @@ if __name__ == "__main__":
             print("\033[1F\033[2K\r", end = "")
             console.print(f"    [bright_black]-> {question}: [bold blue]{values[-1] or 'default'}")
 
-        audio_index = COMMAND_ARGUMENTS.index("libopus") + 1
-
         # Add in ac parameter
         if values[0].strip():
-            COMMAND_ARGUMENTS.insert(audio_index, f"-ac:a:{index}")
-            COMMAND_ARGUMENTS.insert(audio_index + 1, values[0])
-            audio_index += 2
+            settings["audio"] += [f"-ac:a:{index}", values[0]]
 
         # Add in title metadata
         if values[1].strip():
-            COMMAND_ARGUMENTS.insert(audio_index, f"-metadata:s:a:{index}")
-            COMMAND_ARGUMENTS.insert(audio_index + 1, f"title={values[1]}")
-            audio_index += 2
+            settings["audio"] += [f"-metadata:s:a:{index}", f"title={values[1]}"]
 
         # Add in bitrate
         if values[2].strip():
-            COMMAND_ARGUMENTS.insert(audio_index, f"-b:a:{index}")
-            COMMAND_ARGUMENTS.insert(audio_index + 1, f"{values[2]}k")
-
-    # Attach encode settings
-    COMMAND_ARGUMENTS[COMMAND_ARGUMENTS.index("comment=")] += f"SVT-AV1 / CRF {settings['crf']} / Preset {settings['preset']}"
+            settings["audio"] += [f"-b:a:{index}", f"{values[2]}k"]
 
     print()
-    iavx.encode_all(settings)
+    return settings
+
+def worker(console: Console, spool: Spool) -> None:
+    interval, stale = float(argument("--heartbeat", "15")), float(argument("--stale", "300"))  # type: ignore
+    claimed, running = None, True
+
+    # Keep our claim fresh while encoding, so nobody else picks it up
+    def beat() -> None:
+        while running:
+            spool.heartbeat(claimed)
+            time.sleep(interval)
+
+    Thread(target = beat, daemon = True).start()
+    console.print(f"[bright_black]Worker {spool.worker} watching {spool.directory}\n")
+    try:
+        while True:
+            spool.requeue_stale(stale)
+            claimed = spool.claim()
+            if claimed is None:
+                if "--drain" in sys.argv:
+                    break
+
+                time.sleep(5)
+                continue
+
+            job, started, success = json.loads(claimed.read_text()), time.time(), False
+            console.print(f"[yellow]Claimed {claimed.stem}")
+            try:
+                iavx = IAVx(Path(job["file"]), console)
+                success = iavx.encode_all(job["settings"])
+
+            # A bad job gets recorded as failed, requeuing it would just crash the next worker too
+            except (ValueError, OSError, subprocess.CalledProcessError) as e:
+                console.print(f"[red]  -> {e}")
+                job["error"] = str(e)
+
+            spool.finish(claimed, job, success, started)
+            claimed = None
+
+    except KeyboardInterrupt:
+        console.print("\n[red][bold]Worker stopped.[/] Its current job went back to the queue.")
+
+    finally:
+        running = False
+
+        # Hand an interrupted job back to the queue
+        if claimed is not None:
+            spool.requeue(claimed)
+
+        (spool.directory / "workers" / f"{spool.worker}.json").unlink(missing_ok = True)
+
+def watch(console: Console, iavx: IAVx, settings: dict[str, typing.Any]) -> None:
+    """Encode new files as they land in the library, once they've been quiet for --settle seconds."""
+    if iavx.library is None:
+        raise ValueError("Watching requires --library!")
+
+    inotify, settle = Inotify(), float(argument("--settle", "30"))  # type: ignore
+    writing, failed = set(), {}
+    if iavx.failed is not None and iavx.failed.is_file():
+        failed[iavx.failed] = ProbeCache.key(iavx.failed)[1]  # From the first pass
+    console.print(f"[bright_black]Watching {iavx.library.root} for new files...\n")
+    while True:
+        for relative in iavx.library.data["directories"]:
+            inotify.add(iavx.library.root / relative)
+
+        # Wait for activity, then for it to calm down. Our own manifest, temporary files
+        # and outputs are ignored, otherwise every save would wake us right back up
+        def relevant(events: list[tuple[Path, int]]) -> list[tuple[Path, int]]:
+            return [(path, mask) for path, mask in events if not path.name.startswith(".") and "iipython v" not in path.name.lower()]
+
+        events = []
+        while not events:
+            events = relevant(inotify.read(None))
+
+        while events:
+            for path, mask in events:
+                if mask & Inotify.IN_CREATE and not mask & Inotify.IN_ISDIR:
+                    writing.add(path)  # Still being copied in, not safe to encode yet
+
+                elif mask & (Inotify.IN_CLOSE_WRITE | Inotify.IN_MOVED_TO):
+                    writing.discard(path)
+
+                if mask & Inotify.IN_ISDIR and not path.name.startswith("."):
+                    inotify.add(path)
+
+            events = relevant(inotify.read(settle))
+
+        # Files that failed stay skipped until they change
+        skip = writing | {file for file, key in failed.items() if file.is_file() and ProbeCache.key(file)[1] == key}
+        pending = iavx.library.pending(skip)
+        if not pending:
+            continue
+
+        iavx.file_info = iavx.probe_paths(pending, errors := [])
+        for file, reason in errors:
+            console.print(f"[red]  -> Skipping {file.relative_to(iavx.library.root)}, {reason}")
+            if file.is_file():
+                failed[file] = ProbeCache.key(file)[1]
+
+        if not iavx.file_info:
+            continue
+
+        console.print(f"[yellow]Found {len(iavx.file_info)} new file(s)")
+        if not iavx.encode_all(settings) and iavx.failed is not None and iavx.failed.is_file():
+            failed[iavx.failed] = ProbeCache.key(iavx.failed)[1]
+
+def stats(console: Console, log: Path) -> None:
+    """Aggregate the telemetry log by preset, CRF and source codec."""
+    if not log.is_file():
+        return console.print(f"[red]  -> No telemetry recorded yet at {log}")
+
+    groups = {}
+    for line in log.read_text().splitlines():
+        try:
+            record = json.loads(line)
+
+        except json.JSONDecodeError:
+            continue  # Torn write from an interrupted run
+
+        key = (record["settings"]["preset"], record["settings"]["crf"], record["codec"])
+        group = groups.setdefault(key, {"count": 0, "duration": 0, "wall": 0, "frames": 0, "source": 0, "output": 0})
+        group["count"] += 1
+        group["duration"] += record["duration"]
+        group["wall"] += record["wall"]
+        group["frames"] += record["average_fps"] * record["wall"]
+        group["source"] += record["source_size"]
+        group["output"] += record["output_size"]
+
+    console.print(f"[yellow]Telemetry from {sum(group['count'] for group in groups.values())} encode(s)\n")
+    for (preset, crf, codec), group in sorted(groups.items(), key = lambda item: (int(item[0][0]), int(item[0][1]), item[0][2])):
+        console.print(
+            f"  [bright_black]Preset [bold blue]{preset:>2}[/] / CRF [bold blue]{crf:>2}[/] / {codec:<5} -> "
+            f"[/][green]{group['count']}[/] encode(s), [green]{group['frames'] / group['wall']:.1f} fps[/], "
+            f"[green]{group['duration'] / group['wall']:.2f}x[/] realtime, "
+            f"[green]{group['output'] / group['source'] * 100 if group['source'] else 0:.1f}%[/] of source size",
+            highlight = False
+        )
+
+if __name__ == "__main__":
+    console = Console()
+    console.print(f"[bold blue]iiPython AV1 Encoding System v1.{ENCODE_VERSION}\n")
+
+    try:
+        match sys.argv[1:]:
+            case ["worker", *_]:
+                worker(console, Spool(Path(argument("--spool", str(SPOOL_DIRECTORY)))))  # type: ignore
+
+            case ["stats", *_]:
+                stats(console, Path(argument("--telemetry", str(TELEMETRY_LOG))))  # type: ignore
+
+            case ["submit", target, *_]:
+                iavx, spool = IAVx(Path(target), console), Spool(Path(argument("--spool", str(SPOOL_DIRECTORY))))  # type: ignore
+                settings = prompt_settings(console, iavx)
+                for file, _ in iavx.file_info:
+                    console.print(f"[green]  -> Queued {file.name} as {spool.submit(file, settings)}")
+
+            case [target, *_]:
+                iavx = IAVx(Path(target), console)
+                if not iavx.file_info and "--watch" not in sys.argv:
+                    exit(0)
+
+                settings = prompt_settings(console, iavx)
+                if "--estimate" in sys.argv:
+                    iavx.estimate(settings)
+
+                elif not iavx.encode_all(settings) and "--watch" not in sys.argv:
+                    exit(1)
+
+                if "--watch" in sys.argv:
+                    watch(console, iavx, settings)
+
+            case _:
+                console.print("[red]Usage: iavx <file|directory> | iavx submit <file|directory> | iavx worker | iavx stats")
+                exit(1)
+
+    except ValueError as e:
+        console.print(f"[red]  -> {e}")
+        exit(1)
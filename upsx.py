@@ -6,11 +6,8 @@
 # Modules
 import re
 import sys
-import time
-import socket
-import atexit
+import asyncio
 import logging
-import subprocess
 
 # Handle logging
 logging.basicConfig(
@@ -20,7 +17,7 @@ logging.basicConfig(
 )
 log = logging.getLogger("upsx")
 
-__version__ = "0.2.8"
+__version__ = "0.3.0"
 
 # Handle help menu
 if "-h" in sys.argv or "--help" in sys.argv:
@@ -37,9 +34,11 @@ log.info(f"upsx v{__version__} is running: https://github.com/iiarchives/linux-u
 UPSD_TARGET   = "tripplite"   # The name of the UPS you want to track
 UPSD_HOST     = "10.48.1.10"  # The IP address that UPSD is running on
 UPSD_PORT     = 3493          # The port that UPSD is running on, most likely is set to default
+UPSD_TIMEOUT  = 10            # Seconds to wait on upsd before giving up and reconnecting
 LOCAL_PORT    = 0             # The port you want this client listening on, should probably leave this alone
 LOCAL_HOST    = "0.0.0.0"     # The host you want this client listening on, ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
-UPSC_INTERVAL = 5             # Seconds to wait before polling
+UPSC_INTERVAL = 5             # Seconds to wait before polling while on line power
+UPSC_INTERVAL_BATTERY = 1     # Seconds to wait before polling while off line power (on battery, bypass, etc)
 RUN_COMMAND   = [
     {
         # Specific keys from `upsc` that we're monitoring.
@@ -61,100 +60,141 @@ RUN_COMMAND   = [
             ["shutdown", "-P", "now"]
         ],
 
-        # Indicate that the script should exit after this command fires,
+        # Indicate that this UPS should stop being monitored after this command fires,
         # prevents running commands twice (or more) with no debounce.
         "break": True
     }
 ]
 
+# Every UPS to monitor. Each entry needs a "name" and can override "host", "port",
+# "interval", "battery_interval" and "rules" (same format as RUN_COMMAND), falling back to the values above.
+# UPSes on the same upsd share one connection, different upsd servers are polled independently.
+UPS_TARGETS = [
+    {"name": UPSD_TARGET},
+    # {"name": "eaton", "host": "10.48.2.10", "rules": []},
+]
+
 # Handle communication with NUT
-NUT_VARIABLE_REGEX = re.compile(r"VAR \w+ ([\w\.]+) \"(.+)\"")
+NUT_VARIABLE_REGEX = re.compile(r"VAR \w+ ([\w\.]+) \"(.*)\"")
+READOUT_VARIABLES = ["ups.model", "ups.status", "battery.charge", "battery.runtime", "input.voltage", "output.voltage", "battery.voltage"]
 
 class NUTCommunication:
-    def __init__(self) -> None:
-        self.connect()
+    """A single connection to one upsd server. upsd answers in the order it was asked,
+    so every UPS on the server can share it as long as each exchange holds the lock."""
+    def __init__(self, host: str, port: int) -> None:
+        self.host, self.port = host, port
+        self.reader, self.writer = None, None
+        self.lock = asyncio.Lock()
+
+    async def connect(self) -> None:
+        log.info(f"Creating connection to {self.host}:{self.port} from {LOCAL_HOST}:{LOCAL_PORT}")
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, local_addr = (LOCAL_HOST, LOCAL_PORT)),
+            UPSD_TIMEOUT
+        )
 
-    def connect(self) -> None:
-        try:
-            logging.info(f"Creating connection to {UPSD_HOST}:{UPSD_PORT} from {LOCAL_HOST}:{LOCAL_PORT}")
+    def send_line(self, line: str) -> None:
+        log.debug(f"Sent to {self.host}: {line}")
+        self.writer.write((line + "\n").encode())  # type: ignore
 
-            self.socket = socket.create_connection((UPSD_HOST, UPSD_PORT), source_address = (LOCAL_HOST, LOCAL_PORT), timeout = 10)
-            self.file = self.socket.makefile("rwb", buffering = 0)
+    async def recv_line(self) -> str:
+        line = (await asyncio.wait_for(self.reader.readline(), UPSD_TIMEOUT)).decode().strip()  # type: ignore
+        if not line:
+            raise ConnectionError("connection closed by upsd")
 
-        except (OSError, ConnectionError, TimeoutError):
-            log.error("Failed to establish socket connection! Retrying in 10 seconds.")
-            time.sleep(10)
+        log.debug(f"Received from {self.host}: {line}")
+        return line
 
-            self.connect()
+    async def get_variables(self, target: str, names: list[str]) -> dict[str, str]:
+        """Fetch only the given variables, sending every GET VAR up front and then
+        reading the answers back in order. Unsupported variables are left out."""
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    await self.connect()
 
-    def send_line(self, line: str) -> None:
-        logging.debug(f"Sent through socket: {line}")
-        self.file.write((line + "\n").encode())
+                for name in names:
+                    self.send_line(f"GET VAR {target} {name}")
 
-    def recv_line(self) -> str:
-        line = self.file.readline().decode().strip()
-        logging.debug(f"Received line from socket: {line}")
-        return line
+                # Every request gets exactly one reply, read them all so the connection stays in sync
+                variables, errors = {}, []
+                for name in names:
+                    line = await self.recv_line()
+                    line_data = NUT_VARIABLE_REGEX.match(line)
+                    if line_data is None:
+                        errors.append(line)  # ERR VAR-NOT-SUPPORTED and friends
+                        continue
 
-    def fetch_variables(self) -> dict[str, str]:
-        self.send_line(f"LIST VAR {UPSD_TARGET}")
+                    key, value = line_data.groups()
+                    variables[key] = value
 
-        # Process variables
-        variables = {}
-        while True:
-            line = self.recv_line()
-            if not line:
-                log.error("Connection to NUT timed out, reestablishing socket.")
-                self.connect()
-                return self.fetch_variables()
+                # Only VAR-NOT-SUPPORTED is about a single variable, anything else (DATA-STALE,
+                # DRIVER-NOT-CONNECTED, ...) means none of the values can be trusted
+                if "ERR UNKNOWN-UPS" in errors:
+                    raise ValueError(f"upsd doesn't know about {target}")
 
-            if line.startswith("END LIST VAR"):
-                break
+                if (fatal := [error for error in errors if error != "ERR VAR-NOT-SUPPORTED"]):
+                    raise ValueError(f"upsd returned {fatal[0]} for {target}")
 
-            line_data = NUT_VARIABLE_REGEX.match(line)
-            if line_data is None:
-                continue
+                return variables
 
-            key, value = line_data.groups()
-            variables[key] = value
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.CancelledError):
+                self.drop()
+                raise
 
-        return variables
+    async def fetch_variables(self, target: str) -> dict[str, str]:
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    await self.connect()
 
-    def kill(self) -> None:
-        self.send_line("LOGOUT")
-        self.recv_line()
-        self.socket.close()
+                self.send_line(f"LIST VAR {target}")
 
-        log.warning("Connection to NUT killed, daemon is exiting!")
+                # Process variables
+                variables = {}
+                while True:
+                    line = await self.recv_line()
+                    if line.startswith("ERR"):
+                        raise ValueError(f"upsd refused LIST VAR {target}: {line}")
 
-NUT = NUTCommunication()
-atexit.register(NUT.kill)
+                    if line.startswith("END LIST VAR"):
+                        return variables
 
-if "-v" in sys.argv:
-    variables = NUT.fetch_variables().items()
-    biggest = len(max(variables, key = lambda k: len(k[0]))[0])
-    for key, value in variables:
-        print(f"  {key}{' ' * (biggest - len(key))}: {value}")
+                    line_data = NUT_VARIABLE_REGEX.match(line)
+                    if line_data is None:
+                        continue
 
-    exit()
+                    key, value = line_data.groups()
+                    variables[key] = value
+
+            except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.CancelledError):
+                self.drop()
+                raise
 
-# Main event loop
-while True:
-    variables = NUT.fetch_variables()
-
-    # Show a little status readout
-    READOUT_INFO = [
-        ("UPS", f"{variables['ups.model'].strip()} ({variables['ups.status']})"),
-        ("Charge", f"{variables['battery.charge']}%"),
-        ("Runtime", variables["battery.runtime"]),
-        ("Input Voltage", f"{variables['input.voltage']}V"),
-        ("Output Voltage", f"{variables['output.voltage']}V"),
-        ("Battery Voltage", f"{variables['battery.voltage']}V"),
-    ]
-    log.info(" | ".join(f"{k}: {v}" for k, v in READOUT_INFO))
-
-    # Handle launching commands
-    for possible_command in RUN_COMMAND:
+    def drop(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+        self.reader, self.writer = None, None
+
+    async def kill(self) -> None:
+        if self.writer is None:
+            return
+
+        try:
+            self.send_line("LOGOUT")
+            await self.recv_line()
+
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            pass
+
+        self.drop()
+        log.warning(f"Connection to {self.host} killed, daemon is exiting!")
+
+# Handle monitoring
+async def run_commands(label: str, rules: list[dict], variables: dict[str, str]) -> bool:
+    """Launch every rule whose check passes, returns True if monitoring should stop."""
+    for possible_command in rules:
         command_result = possible_command["check"](*[variables.get(key) for key in possible_command["target"]])
         if command_result is not True:
             continue
@@ -164,13 +204,87 @@ while True:
         if isinstance(launch_data[0], str):
             launch_data = [launch_data]
 
-        # And then actually launch everything
+        # And then actually launch everything, without holding up the other UPSes
         for command in launch_data:
-            logging.debug(f"Running command: \"{' '.join(command)}\"")
-            subprocess.run(command)
+            log.debug(f"[{label}] Running command: \"{' '.join(command)}\"")
+            await (await asyncio.create_subprocess_exec(*command)).wait()
 
         if possible_command.get("break") is True:
-            logging.debug("Killing daemon because the matched command has break enabled!")
-            exit()
+            log.debug(f"[{label}] Stopping monitoring because the matched command has break enabled!")
+            return True
+
+    return False
+
+async def monitor(ups: dict, nut: NUTCommunication) -> None:
+    label, rules = f"{ups['name']}@{nut.host}", ups.get("rules", RUN_COMMAND)
+
+    # Only ask for what the readout and rules actually look at
+    names = sorted(set(READOUT_VARIABLES) | {key for rule in rules for key in rule["target"]})
+    while True:
+        try:
+            variables = await nut.get_variables(ups["name"], names)
+
+        except (OSError, ConnectionError, ValueError, asyncio.TimeoutError) as e:
+            log.error(f"[{label}] Failed to fetch variables ({str(e) or type(e).__name__})! Retrying in 10 seconds.")
+            await asyncio.sleep(10)
+            continue
+
+        # Show a little status readout
+        READOUT_INFO = [
+            ("UPS", f"{variables.get('ups.model', '?').strip()} ({variables.get('ups.status')})"),
+            ("Charge", f"{variables.get('battery.charge')}%"),
+            ("Runtime", variables.get("battery.runtime")),
+            ("Input Voltage", f"{variables.get('input.voltage')}V"),
+            ("Output Voltage", f"{variables.get('output.voltage')}V"),
+            ("Battery Voltage", f"{variables.get('battery.voltage')}V"),
+        ]
+        log.info(f"[{label}] " + " | ".join(f"{k}: {v}" for k, v in READOUT_INFO))
+
+        # Handle launching commands, a broken rule shouldn't take the other UPSes down with it
+        try:
+            if await run_commands(label, rules, variables):
+                return
+
+        except Exception as e:
+            log.error(f"[{label}] Failed to run rules ({str(e) or type(e).__name__})!")
+
+        # Poll quickly while off line power, so rules react sooner
+        status = (variables.get("ups.status") or "").split()
+        if "OL" in status and "OB" not in status:
+            await asyncio.sleep(ups.get("interval", UPSC_INTERVAL))
+
+        else:
+            await asyncio.sleep(ups.get("battery_interval", UPSC_INTERVAL_BATTERY))
+
+async def main() -> None:
+
+    # One connection per upsd server
+    connections = {}
+    for ups in UPS_TARGETS:
+        address = (ups.get("host", UPSD_HOST), ups.get("port", UPSD_PORT))
+        if address not in connections:
+            connections[address] = NUTCommunication(*address)
+
+    try:
+        if "-v" in sys.argv:
+            for ups in UPS_TARGETS:
+                variables = (await connections[(ups.get("host", UPSD_HOST), ups.get("port", UPSD_PORT))].fetch_variables(ups["name"])).items()
+                biggest = len(max(variables, key = lambda k: len(k[0]))[0])
+                print(f"{ups['name']}:")
+                for key, value in variables:
+                    print(f"  {key}{' ' * (biggest - len(key))}: {value}")
+
+            return
+
+        # Main event loop
+        await asyncio.gather(*[monitor(ups, connections[(ups.get("host", UPSD_HOST), ups.get("port", UPSD_PORT))]) for ups in UPS_TARGETS])
+
+    finally:
+        for nut in connections.values():
+            await nut.kill()
+
+try:
+    asyncio.run(main())
 
-    time.sleep(UPSC_INTERVAL)
+except KeyboardInterrupt:
+    pass